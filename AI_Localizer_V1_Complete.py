@@ -14,7 +14,8 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 import pandas as pd
-from transformers import MarianMTModel, MarianTokenizer
+import numpy as np
+from transformers import MarianMTModel, MarianTokenizer, GenerationConfig
 import torch
 import math
 import re
@@ -25,6 +26,18 @@ import json
 import random
 import datetime
 import csv
+import argparse
+import sys
+import sqlite3
+import copyreg
+import importlib
+import itertools
+import queue
+import shutil
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 
 # --- IMPORT OPZIONALI ---
 try:
@@ -35,9 +48,14 @@ except ImportError:
 
 try:
     from deep_translator import GoogleTranslator
+    from deep_translator.exceptions import RequestError, TooManyRequests, ServerException
+    import requests
     ONLINE_AVAILABLE = True
+    TRANSIENT_ERRORS = (urllib.error.URLError, ConnectionError, TimeoutError, RequestError, TooManyRequests,
+                        ServerException, requests.exceptions.ConnectionError, requests.exceptions.Timeout)
 except ImportError:
     ONLINE_AVAILABLE = False
+    TRANSIENT_ERRORS = (urllib.error.URLError, ConnectionError, TimeoutError)
 
 try:
     from rapidfuzz import process, fuzz
@@ -45,10 +63,36 @@ try:
 except ImportError:
     FUZZY_AVAILABLE = False
 
+try:
+    import python_calamine  # noqa: F401 (motore "calamine" di pandas per gli .xlsx)
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+try:
+    import pyarrow  # noqa: F401 (parser CSV multi-thread di pandas)
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+try:
+    import ctranslate2
+    CT2_AVAILABLE = True
+except ImportError:
+    CT2_AVAILABLE = False
+
 # --- CONFIGURAZIONE ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROFILES_FILE = os.path.join(SCRIPT_DIR, "profiles.json")
 LOG_FILE = os.path.join(SCRIPT_DIR, "session_log.txt")
+TM_FILE = os.path.join(SCRIPT_DIR, "translation_memory.db")
+QUANT_DIR = os.path.join(SCRIPT_DIR, "quantized_models")
+CONVERTED_DIR = os.path.join(SCRIPT_DIR, "converted_models")
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
@@ -63,15 +107,54 @@ DEFAULT_PATTERNS = [
     {"name": "New Line", "pattern": r'(\\n)', "active": True}
 ]
 
+# Classi di token "sollevate" in placeholder dalla normalizzazione delle chiavi (opzione normalize):
+# "Hai trovato 5 oro" e "Hai trovato 12 oro" diventano lo stesso input per il modello.
+# Il lookbehind su \w evita le cifre dentro __X_n_X__ e dentro le parole (es. "mp3").
+TEMPLATE_PATTERNS = [
+    {"name": "Numbers", "pattern": r'(?<![\w.,])[-+]?\d+(?:[.,]\d+)*(?!\w)', "active": True},
+]
+SPACES_RE = re.compile(r'[ \t]+')
+
+# Placeholder e relative "allucinazioni" dell'IA, in ordine di priorità di recupero:
+# __X_0_X__ esatto, poi {0}, (0), [0], X_0_X (persi gli underscore), __X 0 X__ (spazi aggiunti)
+UNMASK_RE = re.compile(r'__X_(\d+)_X__|\{(\d+)\}|\((\d+)\)|\[(\d+)\]|X_(\d+)_X|__X (\d+) X__')
+UNMASK_FORMS = ["{{{}}}", "({})", "[{}]", "X_{}_X", "__X {} X__"]
+PUNCT_RE = re.compile(r'\s+([.,:;!?])')
+
+# Codici della colonna QA_Status (categorica). *_LEN segue sempre il suo stato base.
+STATUS_CODES = ["OK", "OK_LEN", "ONLINE", "ONLINE_LEN", "SAFETY_FAIL", "SKIPPED"]
+
 class TextProcessor:
     def __init__(self):
         self.placeholder_map = {}
         self.placeholder_counter = 0
         self.regex_rules = []
         self.protection_patterns = []
+        self.mask_re = None
+        self.var_res = []
+        self.template_re = None
+        self.update_templates(TEMPLATE_PATTERNS)
+
+    def update_templates(self, template_list):
+        patterns = [p["pattern"] for p in template_list if p["active"]]
+        try:
+            self.template_re = re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None
+        except:
+            self.template_re = None
 
     def update_patterns(self, pattern_list):
         self.protection_patterns = [p["pattern"] for p in pattern_list if p["active"]]
+        # Compiliamo una volta sola: mask_text/get_variables girano su ogni riga
+        try:
+            self.mask_re = re.compile('|'.join(self.protection_patterns), flags=re.DOTALL) if self.protection_patterns else None
+        except:
+            self.mask_re = None
+        self.var_res = []
+        for p in self.protection_patterns:
+            try:
+                self.var_res.append(re.compile(p))
+            except:
+                pass
 
     def fix_mojibake(self, text):
         text = str(text)
@@ -84,66 +167,99 @@ class TextProcessor:
         return text
 
     def fix_punctuation(self, text):
-        text = re.sub(r'\s+([.,:;!?])', r'\1', text)
+        text = PUNCT_RE.sub(r'\1', text)
         return text
 
-    def mask_text(self, text):
-        self.placeholder_map = {}
-        self.placeholder_counter = 0
-        if not self.protection_patterns: return text
-        
-        full_pattern = '|'.join(self.protection_patterns)
+    def mask(self, text):
+        """
+        Versione senza stato di mask_text: ritorna (testo mascherato, placeholders),
+        dove placeholders[i] è il codice originale di __X_i_X__.
+        Non tocca l'istanza, quindi si può usare riga per riga o in processi paralleli.
+        """
+        if not self.protection_patterns: return text, ()
+
         text = str(text)
-        if not text.strip(): return text
+        if not text.strip(): return text, ()
+        if self.mask_re is None: return text, ()
+
+        seen = {}  # codice -> placeholder (deduplicazione)
+        codes = []
 
         def replacer(match):
             code = match.group(0)
-            # Deduplicazione
-            for k, v in self.placeholder_map.items():
-                if v == code: return k
-            
-            # Usiamo __X_0_X__ come maschera per le variabili in stringa
-            key = f"__X_{self.placeholder_counter}_X__"
-            self.placeholder_map[key] = code
-            self.placeholder_counter += 1
+            key = seen.get(code)
+            if key is None:
+                # Usiamo __X_0_X__ come maschera per le variabili in stringa
+                key = f"__X_{len(codes)}_X__"
+                seen[code] = key
+                codes.append(code)
             return key
 
-        try:
-            return re.sub(full_pattern, replacer, text, flags=re.DOTALL)
-        except:
-            return text
+        return self.mask_re.sub(replacer, text), tuple(codes)
 
-    def unmask_text(self, text):
+    def canonicalize(self, masked, placeholders):
+        """
+        Forma normalizzata di un record di mask: spazi ai bordi tolti, spazi/tab interni
+        compattati e token di TEMPLATE_PATTERNS (numeri) spostati in nuovi placeholder,
+        uno per occorrenza. unmask li rimette al loro posto come le variabili.
+        """
+        masked = SPACES_RE.sub(' ', str(masked).strip())
+        if self.template_re is None: return masked, placeholders
+        codes = list(placeholders)
+
+        def replacer(match):
+            codes.append(match.group(0))
+            return f"__X_{len(codes) - 1}_X__"
+
+        return self.template_re.sub(replacer, masked), tuple(codes)
+
+    def mask_canonical(self, text):
+        return self.canonicalize(*self.mask(text))
+
+    def mask_text(self, text):
+        masked, placeholders = self.mask(text)
+        self.placeholder_map = {f"__X_{i}_X__": c for i, c in enumerate(placeholders)}
+        self.placeholder_counter = len(placeholders)
+        return masked
+
+    def unmask(self, text, placeholders):
         text = str(text)
-        # Ordiniamo per lunghezza inversa (es. 10 prima di 1)
-        sorted_map = sorted(self.placeholder_map.items(), key=lambda x: len(x[0]), reverse=True)
-        
-        for ph, orig in sorted_map:
-            if ph in text:
-                text = text.replace(ph, orig)
-            else:
-                # Se l'IA ha scritto {0} invece di __X_0_X__, proviamo a recuperarlo
-                try:
-                    # Estrai ID numerico da __X_0_X__
-                    ph_id = ph.split('_')[2] 
-                    
-                    # Lista di possibili allucinazioni dell'IA
-                    possible_errors = [
-                        f"{{{ph_id}}}",   # {0}
-                        f"({ph_id})",     # (0)
-                        f"[{ph_id}]",     # [0]
-                        f"X_{ph_id}_X",   # X_0_X (persi gli underscore)
-                        f"__X {ph_id} X__" # Spazi aggiunti
-                    ]
-                    
-                    for err in possible_errors:
-                        if err in text:
-                            text = text.replace(err, orig)
-                            break # Trovato e corretto
-                except:
-                    pass 
+        if not placeholders: return text
+        n = len(placeholders)
+        chosen = {}
+
+        def recovery_form(ph_id):
+            # La forma esatta vince; altrimenti si recupera solo la prima allucinazione presente
+            if ph_id not in chosen:
+                form = None
+                if int(ph_id) < n and f"__X_{ph_id}_X__" not in text:
+                    for k, err in enumerate(UNMASK_FORMS, 2):
+                        if err.format(ph_id) in text:
+                            form = k
+                            break
+                chosen[ph_id] = form
+            return chosen[ph_id]
+
+        def replacer(m):
+            form = m.lastindex
+            ph_id = m.group(form)
+            if form == 1:
+                i = int(ph_id)
+                return placeholders[i] if i < n else m.group(0)
+            if recovery_form(ph_id) == form: return placeholders[int(ph_id)]
+            return m.group(0)
+
+        return UNMASK_RE.sub(replacer, text)
+
+    def has_placeholders(self, text, placeholders):
+        """True se ogni __X_i_X__ del record è nella traduzione (anche in una forma che unmask recupera)."""
+        text = str(text)
+        for i in range(len(placeholders)):
+            if f"__X_{i}_X__" not in text and not any(f.format(i) in text for f in UNMASK_FORMS): return False
+        return True
 
-        return text
+    def unmask_text(self, text):
+        return self.unmask(text, tuple(self.placeholder_map.values()))
 
     def apply_regex_rules(self, text):
         for pattern, replacement in self.regex_rules:
@@ -155,13 +271,1764 @@ class TextProcessor:
     
     def get_variables(self, text):
         found = []
-        for p in self.protection_patterns:
+        for r in self.var_res:
+            found.extend(r.findall(text))
+        return found
+
+    def safety_check(self, o, t):
+        v1 = self.get_variables(o)
+        v2 = self.get_variables(t)
+        return set(v1)==set(v2), t
+
+SHARD_MIN_ROWS = 50000  # sotto questa soglia i processi costano più di quanto fanno risparmiare
+SHARD_CHUNK = 2000
+
+def shard_map(func, *iterables, workers=1):
+    """map() su più processi per file grandi; func deve essere serializzabile (es. metodi di TextProcessor)."""
+    items = [list(it) for it in iterables]
+    if workers <= 1 or not items or len(items[0]) < SHARD_MIN_ROWS:
+        return list(map(func, *items))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(func, *items, chunksize=SHARD_CHUNK))
+
+def read_table(fpath, sheet=None):
+    """Legge un CSV/XLSX come stringhe con le stesse regole usate dalla GUI (parsing memorizzato in DATASETS)."""
+    return DATASETS.frame(fpath, sheet)
+
+SNIFF_BYTES = 64 * 1024
+
+class Dataset:
+    """
+    Handle di un file sorgente: encoding e separatore vengono rilevati una volta sola
+    sui primi SNIFF_BYTES, poi ogni lettura usa il parser C (o pyarrow per le letture complete)
+    invece del lento sep=None / engine='python'.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.is_excel = not path.endswith('.csv')
+        self.encoding = "utf-8-sig"
+        self.sep = ";"
+        if not self.is_excel: self.sniff()
+
+    def sniff(self):
+        with open(self.path, 'rb') as f: raw = f.read(SNIFF_BYTES)
+        if len(raw) == SNIFF_BYTES and b"\n" in raw: raw = raw[:raw.rindex(b"\n")]  # niente caratteri tagliati
+        for enc in ("utf-8-sig", "cp1252", "latin-1"):
             try:
-                found.extend(re.findall(p, text))
+                text = raw.decode(enc)
+                self.encoding = enc
+                break
+            except UnicodeDecodeError:
+                pass
+        header = text.split("\n", 1)[0]
+        # Come prima: il ';' ha la precedenza, gli altri separatori si riconoscono con lo Sniffer
+        if ";" in header: return
+        try:
+            self.sep = csv.Sniffer().sniff(text, delimiters=";,\t|").delimiter
+        except csv.Error:
+            pass
+
+    def read_csv(self, **kwargs):
+        return pd.read_csv(self.path, sep=self.sep, encoding=self.encoding, dtype=str, keep_default_na=False,
+                           on_bad_lines='skip', **kwargs)
+
+    def read(self, sheet=None, nrows=None):
+        if self.is_excel:
+            df = read_excel_sheet(self.path, sheet)
+            if nrows is not None: df = df.head(nrows)
+        elif PYARROW_AVAILABLE and nrows is None:
+            try:
+                df = self.read_csv(engine='pyarrow')
+            except Exception:
+                df = self.read_csv(engine='c', nrows=nrows)
+        else:
+            df = self.read_csv(engine='c', nrows=nrows)
+        df.columns = df.columns.str.strip()
+        return df
+
+    def chunks(self, chunksize):
+        return self.read_csv(engine='c', chunksize=chunksize)
+
+DATASET_CACHE_MB = 512   # budget di memoria dei DataFrame tenuti da DatasetCache
+PREFETCH_MAX_MB = 100    # oltre questa dimensione su disco la GUI non legge il file in anticipo
+
+class DatasetCache:
+    """
+    Parsing condiviso tra caricamento file, anteprima, merge e run: handle e DataFrame
+    memorizzati per (percorso, mtime, dimensione), eviction LRU oltre max_mb di memoria stimata.
+    Un parsing in corso è condiviso: chi chiede lo stesso file nel frattempo aspetta quello.
+    I DataFrame in cache (o condivisi da un parsing) non vengono mai modificati: frame() ne dà
+    una copia; take() consegna il DataFrame senza copia e lo toglie dalla cache quando nessun
+    altro lo sta leggendo (è la lettura del run, l'ultimo a usarlo).
+    """
+    def __init__(self, max_mb=DATASET_CACHE_MB):
+        self.max_mb = max_mb
+        self.handles = {}
+        self.frames = OrderedDict()  # chiave -> (DataFrame, MB stimati)
+        self.inflight = {}           # chiave -> Future del parsing in corso
+        self.readers = {}            # chiave -> lettori in attesa che devono ancora copiare
+        self.lock = threading.Lock()
+        self.stats = {"parses": 0, "hits": 0}
+
+    @staticmethod
+    def key(path):
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def handle(self, path):
+        key = self.key(path)
+        with self.lock:
+            ds = self.handles.get(key)
+        if ds is None:
+            ds = Dataset(path)
+            with self.lock:
+                # Un file modificato invalida le voci vecchie dello stesso percorso
+                for k in [k for k in self.handles if k[0] == key[0]]: del self.handles[k]
+                self.handles[key] = ds
+        return ds
+
+    def used_mb(self):
+        return sum(mb for _, mb in self.frames.values())
+
+    def _load(self, path, sheet, take=False, warm=False):
+        """warm=True: solo parsing e cache, ritorna il numero di righe senza copiare nulla."""
+        from concurrent.futures import Future
+        key = self.key(path) + (sheet,)
+        with self.lock:
+            if key in self.frames:
+                self.stats["hits"] += 1
+                if warm: return len(self.frames[key][0])
+                if take and not self.readers.get(key):
+                    return self.frames.pop(key)[0]
+                self.frames.move_to_end(key)
+                return self.frames[key][0].copy()
+            fut = self.inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self.inflight[key] = Future()
+            else:
+                self.readers[key] = self.readers.get(key, 0) + 1
+        if not owner:
+            try:
+                df = fut.result()
+                with self.lock:
+                    self.stats["hits"] += 1
+                    if warm: return len(df)
+                    if take and self.readers[key] == 1 and self.frames.get(key, (None,))[0] is df:
+                        return self.frames.pop(key)[0]  # messo in cache da chi l'ha letto, nessun altro in attesa
+                    return df.copy()
+            finally:
+                with self.lock:
+                    self.readers[key] -= 1
+                    if not self.readers[key]: del self.readers[key]
+
+        try:
+            df = self.handle(path).read(sheet)
+        except BaseException as e:
+            with self.lock: del self.inflight[key]
+            fut.set_exception(e)
+            raise
+        mb = 0.0 if take else df.memory_usage(index=True, deep=True).sum() / (1024 * 1024)
+        with self.lock:
+            self.stats["parses"] += 1
+            del self.inflight[key]
+            for k in [k for k in self.frames if k[0] == key[0] and k != key]: del self.frames[k]
+            cached = not take and mb <= self.max_mb
+            if cached:
+                self.frames[key] = (df, mb)
+                while self.used_mb() > self.max_mb: self.frames.popitem(last=False)
+            fut.set_result(df)
+            if warm: return len(df)
+            # Senza altri lettori e fuori dalla cache il DataFrame è solo nostro: niente copia
+            if not cached and not self.readers.get(key): return df
+            return df.copy()
+
+    def frame(self, path, sheet=None):
+        """DataFrame del file da modificare a piacere (copia se è in cache o condiviso)."""
+        return self._load(path, sheet, take=False)
+
+    def take(self, path, sheet=None):
+        """Come frame(), ma toglie il DataFrame dalla cache invece di copiarlo."""
+        return self._load(path, sheet, take=True)
+
+    def warm(self, path, sheet=None):
+        """Lettura anticipata in cache (o attesa di quella in corso); ritorna le righe."""
+        return self._load(path, sheet, warm=True)
+
+    def head(self, path, nrows, sheet=None):
+        """Prime nrows righe: dal DataFrame già letto se c'è, altrimenti lettura parziale."""
+        key = self.key(path) + (sheet,)
+        with self.lock:
+            entry = self.frames.get(key)
+            if entry is not None: return entry[0].head(nrows).copy()
+        return self.handle(path).read(sheet, nrows=nrows)
+
+    def clear(self):
+        with self.lock:
+            self.handles.clear()
+            self.frames.clear()
+
+DATASETS = DatasetCache()
+
+def excel_engine():
+    return "calamine" if CALAMINE_AVAILABLE else "openpyxl read-only"
+
+def iter_sheet_rows(fpath, sheet=None):
+    """Righe di un foglio come liste di stringhe, in streaming (openpyxl read-only)."""
+    from openpyxl import load_workbook
+    wb = load_workbook(fpath, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        for row in ws.iter_rows(values_only=True):
+            yield ["" if v is None else str(v) for v in row]
+    finally:
+        wb.close()
+
+def read_excel_sheet(fpath, sheet=None):
+    """
+    Un foglio (default il primo) come DataFrame di stringhe, "" per le celle vuote come nei CSV.
+    Con python-calamine si usa il lettore Rust di pandas, altrimenti openpyxl in read-only.
+    """
+    if CALAMINE_AVAILABLE:
+        return pd.read_excel(fpath, sheet_name=sheet or 0, dtype=str, keep_default_na=False, engine="calamine")
+    rows = iter_sheet_rows(fpath, sheet)
+    header = next(rows, [])
+    width = len(header)
+    data = [(r + [""] * (width - len(r)))[:width] for r in rows]
+    return pd.DataFrame(data, columns=header, dtype=object)
+
+def write_excel(out, src_path, col, texts, src_texts, sheet=None, statuses=None):
+    """
+    Copia in streaming il workbook di origine (openpyxl read-only -> write-only): nel foglio tradotto
+    cambiano solo le celle tradotte, scritte come testo ("=== Menu ===" non diventa una formula),
+    più la colonna QA_Status. Tutte le altre celle, anche negli altri fogli, restano col loro tipo:
+    numeri, date (col formato numerico) e formule. Stili, larghezze e celle unite non vengono copiati.
+    Riga i del DataFrame = riga i + 2 del foglio (intestazione in riga 1, come in read_excel_sheet).
+    Scrittura atomica.
+    """
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.cell import WriteOnlyCell
+    src = load_workbook(src_path, read_only=True)  # niente data_only: le formule restano formule
+    wb = Workbook(write_only=True)
+    texts = list(texts)
+    src_texts = list(src_texts)
+    statuses = None if statuses is None else [str(v) for v in statuses]
+
+    def copy_cell(ws, c):
+        if c.value is None or c.number_format == "General": return c.value
+        cell = WriteOnlyCell(ws, value=c.value)
+        cell.number_format = c.number_format
+        return cell
+
+    def as_text(ws, value):
+        # openpyxl prende per formula ogni stringa che inizia con "="
+        if not value.startswith("="): return value
+        cell = WriteOnlyCell(ws, value=value)
+        cell.data_type = 's'
+        return cell
+
+    def put(values, idx, value):
+        if len(values) <= idx: values.extend([None] * (idx + 1 - len(values)))
+        values[idx] = value
+
+    try:
+        target = sheet or src.sheetnames[0]
+        for name in src.sheetnames:
+            ws = wb.create_sheet(title=name)
+            rows = src[name].iter_rows()
+            if name != target:
+                for row in rows: ws.append([copy_cell(ws, c) for c in row])
+                continue
+            header = [copy_cell(ws, c) for c in next(rows, ())]
+            # Nomi ripuliti come in Dataset.read (df.columns.str.strip())
+            names = ["" if getattr(h, "value", h) is None else str(getattr(h, "value", h)).strip() for h in header]
+            if col not in names:
+                raise ValueError(f"Colonna '{col}' non trovata nell'intestazione del foglio '{name}'")
+            col_idx = names.index(col)
+            st_idx = names.index("QA_Status") if "QA_Status" in names else len(names)
+            if statuses is not None: put(header, st_idx, "QA_Status")
+            ws.append(header)
+            for i, row in enumerate(rows):
+                values = [copy_cell(ws, c) for c in row]
+                if i < len(texts) and texts[i] != src_texts[i]:
+                    # Cella tradotta; quelle non toccate restano col loro tipo (numero, formula, ...)
+                    put(values, col_idx, as_text(ws, texts[i]))
+                if statuses is not None and i < len(statuses): put(values, st_idx, statuses[i])
+                ws.append(values)
+        tmp = out + ".part.xlsx"
+        wb.save(tmp)
+        os.replace(tmp, out)
+    finally:
+        src.close()
+
+def read_glossary(path):
+    df = pd.read_csv(path, sep=None, engine='python', header=None)
+    return dict(zip(df[0].astype(str), df[1].astype(str)))
+
+def trie_regex(words):
+    """Regex a trie delle parole: un solo passaggio, con i quantificatori greedy vince la più lunga."""
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w: node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts: return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+class GlossaryEngine:
+    """
+    Glossario compilato una volta in un'unica regex a trie (match più lungo per primo).
+    Le variabili protette e i placeholder __X_n_X__ vengono riconosciuti nello stesso
+    passaggio e lasciati intatti, così un termine non riscrive mai il codice di gioco.
+    """
+    def __init__(self, glossary, protect_pattern=None, whole_words=False):
+        self.glossary = {str(k): str(v) for k, v in glossary.items() if str(k)}
+        self.regex = None
+        if not self.glossary: return
+        term = trie_regex(self.glossary)
+        if whole_words: term = rf'(?<!\w){term}(?!\w)'
+        keep = r'__X_\d+_X__'
+        if protect_pattern:
+            try:
+                re.compile(protect_pattern)
+                keep = f'{protect_pattern}|{keep}'
             except:
                 pass
+        try:
+            self.regex = re.compile(f'(?P<keep>{keep})|(?P<term>{term})', flags=re.DOTALL)
+        except re.error:
+            # Pattern utente con riferimenti a gruppi numerati: proteggiamo solo i placeholder
+            self.regex = re.compile(rf'(?P<keep>__X_\d+_X__)|(?P<term>{term})', flags=re.DOTALL)
+
+    def _replace(self, m):
+        term = m.group('term')
+        return self.glossary[term] if term is not None else m.group(0)
+
+    def apply(self, text):
+        if self.regex is None or not isinstance(text, str): return text
+        return self.regex.sub(self._replace, text)
+
+    def apply_series(self, series):
+        """Applica il glossario una volta per valore unico della colonna."""
+        if self.regex is None: return series
+        uniq = series.unique()
+        return series.map(dict(zip(uniq, map(self.apply, uniq))))
+
+FUZZY_BLOCK = 256  # righe di query per chiamata a cdist (limita la memoria della matrice)
+
+class FuzzyIndex:
+    """
+    Indice per il fuzzy match (fuzz.ratio) sulle frasi sorgente del file di riferimento.
+    fuzz.ratio <= 200*min(l1,l2)/(l1+l2), quindi per ogni lunghezza di query si scartano
+    a priori i candidati che non possono superare la soglia (filtro esatto, nessun match perso);
+    i restanti si confrontano a blocchi con process.cdist su tutti i core.
+    """
+    def __init__(self, choices):
+        self.choices = list(choices)
+        self.lengths = np.fromiter((len(c) for c in self.choices), dtype=np.int64, count=len(self.choices))
+        self.pruned = 0
+
+    def match_many(self, queries, cutoff=90):
+        """Per ogni query ritorna la scelta migliore con score > cutoff (o None), come extractOne."""
+        results = [None] * len(queries)
+        q_len = np.fromiter((len(q) for q in queries), dtype=np.int64, count=len(queries))
+        for L in np.unique(q_len):
+            q_idx = np.flatnonzero(q_len == L)
+            cand = np.flatnonzero(200 * np.minimum(L, self.lengths) > cutoff * (L + self.lengths))
+            self.pruned += len(q_idx) * (len(self.choices) - len(cand))
+            if not len(cand): continue
+            cand_txt = [self.choices[i] for i in cand]
+            for b in range(0, len(q_idx), FUZZY_BLOCK):
+                block = q_idx[b:b+FUZZY_BLOCK]
+                scores = process.cdist([queries[i] for i in block], cand_txt, scorer=fuzz.ratio,
+                                       score_cutoff=cutoff, workers=-1)
+                best = scores.argmax(axis=1)
+                for qi, bi, row in zip(block, best, scores):
+                    if row[bi] > cutoff: results[qi] = cand_txt[bi]
+        return results
+
+def merge_reference(texts, ref_dict, use_fuzzy=False, cutoff=90):
+    """
+    Recupera le traduzioni da un vecchio file: match esatto sul testo ripulito,
+    poi (opzionale) fuzzy match in batch sulle frasi rimaste.
+    Ritorna (nuova colonna, esatti, fuzzy, candidati scartati dall'indice).
+    """
+    out = []
+    missing = {}
+    matches = 0
+    for i, txt in enumerate(texts):
+        txt_clean = str(txt).strip()
+        if txt_clean in ref_dict:
+            out.append(ref_dict[txt_clean])
+            matches += 1
+        else:
+            out.append(txt)
+            if use_fuzzy and txt_clean: missing.setdefault(txt_clean, []).append(i)
+
+    fuzzy_matches = 0
+    pruned = 0
+    if missing:
+        index = FuzzyIndex(ref_dict.keys())
+        queries = list(missing)
+        for q, best in zip(queries, index.match_many(queries, cutoff)):
+            if best is None: continue
+            for i in missing[q]: out[i] = ref_dict[best]
+            fuzzy_matches += len(missing[q])
+        pruned = index.pruned
+    return out, matches, fuzzy_matches, pruned
+
+def read_profile(name, path=PROFILES_FILE):
+    if not os.path.exists(path): return {}
+    with open(path, 'r') as f: return json.load(f).get(name, {})
+
+class TranslationMemory:
+    """
+    Memoria di traduzione persistente (SQLite), condivisa tra file, sessioni e profili.
+    Chiave: (modello, lingua sorgente, lingua destinazione, testo mascherato);
+    il modello è "nome[@backend][@precisione][@decoding]" (vedi LocalizationEngine.cache_model).
+    """
+    CHUNK = 500  # limite prudente di parametri per query IN (...)
+
+    def __init__(self, path=TM_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tm ("
+            "model TEXT NOT NULL, src TEXT NOT NULL, tgt TEXT NOT NULL, "
+            "source TEXT NOT NULL, target TEXT NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (model, src, tgt, source)) WITHOUT ROWID")
+        self.conn.commit()
+
+    def lookup(self, model, src, tgt, texts):
+        found = {}
+        texts = list(texts)
+        for i in range(0, len(texts), self.CHUNK):
+            chunk = texts[i:i+self.CHUNK]
+            q = ("SELECT source, target FROM tm WHERE model=? AND src=? AND tgt=? AND source IN (%s)"
+                 % ",".join("?" * len(chunk)))
+            found.update(self.conn.execute(q, [model, src, tgt] + chunk).fetchall())
         return found
 
+    def store(self, model, src, tgt, pairs):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tm (model, src, tgt, source, target, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            [(model, src, tgt, s, t, now) for s, t in pairs])
+        self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tm").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+class CheckpointJournal:
+    """
+    Checkpoint append-only ({file}.journal.jsonl): ogni batch aggiunge solo le sue righe,
+    quindi il costo del salvataggio è O(batch) e un crash a metà scrittura
+    rovina al massimo l'ultima riga, che al replay viene ignorata.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+
+    def replay(self):
+        cache = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        cache[rec["s"]] = rec["t"]
+                    except:
+                        pass  # riga troncata da un crash
+        return cache
+
+    def append(self, pairs):
+        if self.f is None:
+            self.f = open(self.path, 'a', encoding='utf-8')
+            self._terminate_last_line()
+        self.f.write("".join(json.dumps({"s": s, "t": t}, ensure_ascii=False) + "\n" for s, t in pairs))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def _terminate_last_line(self):
+        """Dopo un crash l'ultima riga può essere troncata e senza "\\n": la si chiude,
+        altrimenti il primo record della ripresa verrebbe incollato a lei e perso."""
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0: return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n": return
+        self.f.write("\n")
+
+    def compact(self):
+        """Riscrive il journal con una sola riga per stringa (scrittura atomica)."""
+        self.close()
+        cache = self.replay()
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for s, t in cache.items():
+                f.write(json.dumps({"s": s, "t": t}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path): os.remove(self.path)
+
+class RateLimiter:
+    """Limite di richieste al secondo condiviso tra thread (slot a intervalli regolari)."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_t = 0.0
+
+    def wait(self):
+        if not self.interval: return
+        with self.lock:
+            now = time.monotonic()
+            t = max(now, self.next_t)
+            self.next_t = t + self.interval
+        if t > now: time.sleep(t - now)
+
+def is_transient(exc):
+    """Errori per cui ha senso riprovare: rete, 429 e 5xx. Il resto (lingua non
+    supportata, testo troppo lungo, 4xx) fallirebbe identico a ogni tentativo."""
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code == 429 or exc.code >= 500
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+class LibreClient:
+    """
+    Client minimo per un endpoint compatibile LibreTranslate (POST /translate con
+    "q" lista di testi): una richiesta HTTP traduce un intero batch.
+    È il percorso usato con online_url, ad esempio un'istanza self-hosted o il
+    server di prova locale (fake_translation_server.py).
+    """
+    def __init__(self, base_url, src, tgt, timeout=30):
+        self.url = base_url.rstrip("/") + "/translate"
+        self.src = src
+        self.tgt = tgt
+        self.timeout = timeout
+
+    def translate_batch(self, texts):
+        body = json.dumps({"q": list(texts), "source": self.src, "target": self.tgt, "format": "text"})
+        req = urllib.request.Request(self.url, data=body.encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            out = json.loads(resp.read().decode("utf-8"))["translatedText"]
+        if isinstance(out, str): out = [out]
+        if len(out) != len(texts):
+            raise ValueError(f"Risposta con {len(out)} testi invece di {len(texts)}")
+        return out
+
+class OnlineFallback:
+    """
+    Client concorrente per il fallback online: dedup delle frasi, pool di thread,
+    limite di richieste al secondo e retry con backoff esponenziale solo sugli errori
+    transitori (is_transient); gli altri danno subito None.
+    Senza base_url usa Google Translate, una frase per richiesta (un GoogleTranslator
+    per thread, perché l'oggetto non è thread-safe). Con base_url parla con un endpoint
+    LibreTranslate e manda BATCH frasi per richiesta.
+    """
+    BATCH = 8
+
+    def __init__(self, src, tgt, workers=4, rate=5.0, retries=3, base_url=None):
+        self.src = src
+        self.tgt = tgt
+        self.workers = max(1, int(workers))
+        self.retries = retries
+        self.client = LibreClient(base_url, src, tgt) if base_url else None
+        self.limiter = RateLimiter(rate)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def _translator(self):
+        tr = getattr(self.local, "tr", None)
+        if tr is None:
+            tr = GoogleTranslator(source=self.src, target=self.tgt)
+            self.local.tr = tr
+        return tr
+
+    def _request(self, func, arg):
+        """Una chiamata con retry; solleva l'ultimo errore se non si recupera."""
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            with self.lock: self.requests += 1
+            try:
+                return func(arg)
+            except Exception as e:
+                with self.lock: self.errors += 1
+                if not is_transient(e) or attempt == self.retries: raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def _translate_one(self, text):
+        try:
+            return self._request(self._translator().translate, text)
+        except Exception:
+            return None
+
+    def _translate_batch(self, batch):
+        try:
+            return self._request(self.client.translate_batch, batch)
+        except Exception as e:
+            if is_transient(e) or len(batch) == 1: return [None] * len(batch)
+        # Errore definitivo sul batch (es. un testo non valido): si isolano le frasi
+        return [r for t in batch for r in self._translate_batch([t])]
+
+    def translate_many(self, texts):
+        uniq = list(dict.fromkeys(texts))
+        from concurrent.futures import ThreadPoolExecutor
+        if self.client is not None:
+            batches = [uniq[i:i+self.BATCH] for i in range(0, len(uniq), self.BATCH)]
+            with ThreadPoolExecutor(max_workers=self.workers) as ex:
+                results = [r for batch in ex.map(self._translate_batch, batches) for r in batch]
+            return dict(zip(uniq, results))
+        try:
+            # Costruito fuori dal retry: una lingua non supportata fallisce qui, una volta sola
+            self._translator()
+        except Exception:
+            with self.lock: self.errors += 1
+            return dict.fromkeys(uniq)
+        with ThreadPoolExecutor(max_workers=self.workers) as ex:
+            return dict(zip(uniq, ex.map(self._translate_one, uniq)))
+
+def quantized_path(name):
+    safe = re.sub(r'[^\w.-]+', '_', name)
+    return os.path.join(QUANT_DIR, f"{safe}.torch{torch.__version__}.int8.pt")
+
+class TorchModuleRef:
+    """Si serializza come import_module("torch"): serve al reducer di torch.qscheme."""
+    def __reduce__(self):
+        return (importlib.import_module, ("torch",))
+
+def load_int8_model(name):
+    """
+    Copia int8 (quantizzazione dinamica dei Linear) per la CPU.
+    La quantizzazione si fa una volta per modello: il risultato resta in QUANT_DIR.
+    """
+    path = quantized_path(name)
+    if os.path.exists(path):
+        try:
+            return torch.load(path, weights_only=False)
+        except:
+            pass  # file di un'altra versione o corrotto: si rigenera
+    model = MarianMTModel.from_pretrained(name)
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(QUANT_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    # torch.qscheme non ha __module__: senza reducer pickle scorre sys.modules e
+    # tocca i moduli alias "lazy" di transformers, che importano dipendenze opzionali
+    copyreg.pickle(torch.qscheme, lambda q: (getattr, (TorchModuleRef(), str(q).rsplit('.', 1)[-1])))
+    torch.save(model, tmp)
+    os.replace(tmp, path)
+    return model
+
+def cpu_threads():
+    """Core realmente disponibili al processo (rispetta affinity/limiti del container)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+class RunMetrics:
+    """
+    Tempi per stadio e contatori di un run (lettura, mask, tokenize, prepare, generate, decode, QA, scrittura...).
+    snapshot() ritorna il report con i valori derivati (token/s, padding, hit rate della cache, batch,
+    picco di memoria); write_json/write_prometheus lo salvano accanto all'output.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = OrderedDict()  # nome -> {"seconds", "calls", "items"}
+        self.counters = {}
+        self.batch_sizes = []
+        self.start = time.time()
+
+    @contextmanager
+    def stage(self, name, items=0):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t
+            with self.lock:
+                st = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "items": 0})
+                st["seconds"] += elapsed
+                st["calls"] += 1
+                st["items"] += items
+
+    def add(self, name, value=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_items(self, stage, items):
+        """Elementi di uno stadio noti solo alla fine (es. righe lette)."""
+        with self.lock: self.stages[stage]["items"] += items
+
+    def batch(self, lengths):
+        """Un batch di generate: righe, token reali e token con padding."""
+        with self.lock: self.batch_sizes.append(len(lengths))
+        self.add("tokens_in", sum(lengths))
+        self.add("tokens_padded", len(lengths) * max(lengths))
+
+    @staticmethod
+    def peak_memory():
+        mem = {}
+        if resource is not None:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            mem["peak_rss_bytes"] = rss if sys.platform == "darwin" else rss * 1024
+        if torch.cuda.is_available(): mem["peak_cuda_bytes"] = torch.cuda.max_memory_allocated()
+        return mem
+
+    def snapshot(self):
+        c = dict(self.counters)
+        # generate nel processo (sequenziale/pipeline) o nei worker (generate_parallel)
+        gen = sum(self.stages.get(k, {}).get("seconds", 0.0) for k in ("generate", "generate_parallel"))
+        units = c.get("units", 0)
+        sizes = sorted(self.batch_sizes)
+        derived = {
+            "tokens_in_per_s": round(c.get("tokens_in", 0) / gen, 1) if gen else None,
+            "tokens_out_per_s": round(c.get("tokens_out", 0) / gen, 1) if gen else None,
+            "padding_ratio": round(1 - c["tokens_in"] / c["tokens_padded"], 4) if c.get("tokens_padded") else None,
+            "cache_hit_rate": round((c.get("journal_hits", 0) + c.get("tm_hits", 0)) / units, 4) if units else None,
+            "batches": len(sizes),
+            "batch_size_mean": round(sum(sizes) / len(sizes), 1) if sizes else None,
+            "batch_size_p50": sizes[len(sizes) // 2] if sizes else None,
+            "batch_size_max": sizes[-1] if sizes else None,
+        }
+        stages = {k: dict(v, seconds=round(v["seconds"], 4)) for k, v in self.stages.items()}
+        return {"wall_seconds": round(time.time() - self.start, 3), "stages": stages, "counters": c,
+                "derived": derived, "memory": self.peak_memory()}
+
+    def summary(self, top=4):
+        worst = sorted(self.stages.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:top]
+        return ", ".join(f"{k} {v['seconds']:.1f}s" for k, v in worst)
+
+    def write_json(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+    def write_prometheus(self, path):
+        """Formato testo di Prometheus (textfile collector di node_exporter), scrittura atomica."""
+        snap = self.snapshot()
+        lines = ["# TYPE localizer_stage_seconds gauge"]
+        lines += [f'localizer_stage_seconds{{stage="{k}"}} {v["seconds"]}' for k, v in snap["stages"].items()]
+        lines.append("# TYPE localizer_stage_items gauge")
+        lines += [f'localizer_stage_items{{stage="{k}"}} {v["items"]}' for k, v in snap["stages"].items()]
+        for k, v in list(snap["counters"].items()) + list(snap["derived"].items()) + list(snap["memory"].items()):
+            if v is None: continue
+            lines.append(f"# TYPE localizer_{k} gauge")
+            lines.append(f"localizer_{k} {v}")
+        lines.append(f"localizer_wall_seconds {snap['wall_seconds']}")
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+def metrics_stage(metrics, name, items=0):
+    return metrics.stage(name, items) if metrics is not None else nullcontext()
+
+# Profili di decoding: beam (None = quello del checkpoint) e limite di token generati
+# rispetto all'input (ratio * token del più lungo del batch + extra), così una label
+# corta non può "allucinare" un paragrafo né sprecare passi di decoding.
+DECODING_PROFILES = {
+    "Fast": {"num_beams": 1, "len_ratio": 1.5, "len_extra": 8},
+    "Balanced": {"num_beams": 2, "len_ratio": 2.0, "len_extra": 10},
+    "Quality": {"num_beams": None, "len_ratio": 3.0, "len_extra": 16},
+}
+MAX_GEN_TOKENS = 512
+
+def decode_args(profile, ids_list):
+    """Argomenti di generate per un batch; profilo None = default del checkpoint."""
+    prof = DECODING_PROFILES.get(profile)
+    if prof is None or not ids_list: return {}
+    longest = max(len(x) for x in ids_list)
+    return {"num_beams": prof["num_beams"],
+            "max_new_tokens": min(MAX_GEN_TOKENS, int(longest * prof["len_ratio"]) + prof["len_extra"])}
+
+class TorchBackend:
+    """Backend di default: MarianMTModel.generate di transformers (fp32, fp16 o int8)."""
+    name = "torch"
+
+    def __init__(self, tokenizer, model, device="cpu"):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        # Limite del checkpoint, lo stesso che CT2Backend applica a max_decoding_length
+        self.max_length = getattr(model.generation_config, "max_length", None) or 512
+        self.mb = self.model_mb(model)
+
+    @staticmethod
+    def model_mb(model):
+        # state_dict include anche i pesi int8 impacchettati; i pesi condivisi si contano una volta
+        total = 0
+        seen = set()
+        for v in model.state_dict().values():
+            for t in (v if isinstance(v, tuple) else (v,)):
+                if isinstance(t, torch.Tensor) and t.data_ptr() not in seen:
+                    seen.add(t.data_ptr())
+                    total += t.numel() * t.element_size()
+        return total / (1024 * 1024)
+
+    def encode(self, texts):
+        return self.tokenizer(texts, truncation=True, max_length=512)["input_ids"]
+
+    # generate = prepare -> run -> decode; i tre passi separati servono alla pipeline a thread
+    def prepare(self, ids_list, metrics=None):
+        """Padding al batch e tensori sul device."""
+        with metrics_stage(metrics, "prepare", len(ids_list)):
+            return self.tokenizer.pad({"input_ids": ids_list}, return_tensors="pt").to(self.device)
+
+    def run(self, inputs, num_beams=None, max_new_tokens=None, metrics=None):
+        kwargs = {}
+        if num_beams: kwargs["num_beams"] = num_beams
+        if max_new_tokens:
+            # max_length=None: il limite del profilo sostituisce quello del checkpoint senza che
+            # transformers avvisi a ogni batch che sono impostati entrambi
+            kwargs["max_new_tokens"] = min(max_new_tokens, self.max_length)
+            kwargs["max_length"] = None
+        with metrics_stage(metrics, "generate", len(inputs["input_ids"])):
+            with torch.no_grad(): trans = self.model.generate(**inputs, **kwargs)
+        if metrics is not None: metrics.add("tokens_out", int((trans != self.tokenizer.pad_token_id).sum()))
+        return trans
+
+    def decode(self, trans, metrics=None):
+        with metrics_stage(metrics, "decode", len(trans)):
+            return self.tokenizer.batch_decode(trans, skip_special_tokens=True)
+
+    def generate(self, ids_list, num_beams=None, max_new_tokens=None, metrics=None):
+        """input_ids già tokenizzati -> testi tradotti (padding solo al batch)."""
+        return self.decode(self.run(self.prepare(ids_list, metrics), num_beams, max_new_tokens, metrics), metrics)
+
+    def translate(self, texts, decoding=None):
+        ids = self.encode(texts)
+        return self.generate(ids, **decode_args(decoding, ids))
+
+def converted_path(name):
+    safe = re.sub(r'[^\w.-]+', '_', name)
+    return os.path.join(CONVERTED_DIR, f"{safe}.ct2-{ctranslate2.__version__}")
+
+def load_ct2_translator(name, device, precision):
+    """
+    Modello CTranslate2 per il checkpoint Marian. La conversione si fa una volta per modello
+    (in CONVERTED_DIR, pesi fp32); la precisione si sceglie al caricamento con compute_type.
+    """
+    path = converted_path(name)
+    if not os.path.exists(os.path.join(path, "model.bin")):
+        os.makedirs(CONVERTED_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        ctranslate2.converters.TransformersConverter(name).convert(tmp, force=True)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+    compute_type = {"int8": "int8", "fp16": "float16"}.get(precision, "default")
+    # Stessi thread impostati per torch dal motore (--cpu-threads)
+    return ctranslate2.Translator(path, device=device, compute_type=compute_type,
+                                  intra_threads=torch.get_num_threads() if device == "cpu" else 0), path
+
+class CT2Backend:
+    """
+    Backend CTranslate2: stesso tokenizer Marian, decoding nel runtime C++ (di solito
+    più veloce di torch su CPU). Beam e lunghezza massima vengono dal checkpoint originale.
+    """
+    name = "ct2"
+
+    def __init__(self, tokenizer, translator, path, beam_size=4, max_length=512):
+        self.tokenizer = tokenizer
+        self.translator = translator
+        self.beam_size = beam_size
+        self.max_length = max_length
+        self.mb = os.path.getsize(os.path.join(path, "model.bin")) / (1024 * 1024)
+
+    def encode(self, texts):
+        return self.tokenizer(texts, truncation=True, max_length=512)["input_ids"]
+
+    def prepare(self, ids_list, metrics=None):
+        with metrics_stage(metrics, "prepare", len(ids_list)):
+            return [self.tokenizer.convert_ids_to_tokens(ids) for ids in ids_list]
+
+    def run(self, tokens, num_beams=None, max_new_tokens=None, metrics=None):
+        with metrics_stage(metrics, "generate", len(tokens)):
+            results = self.translator.translate_batch(tokens, max_batch_size=len(tokens), beam_size=num_beams or self.beam_size,
+                                                      max_decoding_length=min(max_new_tokens or self.max_length, self.max_length))
+        if metrics is not None: metrics.add("tokens_out", sum(len(r.hypotheses[0]) for r in results))
+        return results
+
+    def decode(self, results, metrics=None):
+        with metrics_stage(metrics, "decode", len(results)):
+            return [self.tokenizer.decode(self.tokenizer.convert_tokens_to_ids(r.hypotheses[0]), skip_special_tokens=True)
+                    for r in results]
+
+    def generate(self, ids_list, num_beams=None, max_new_tokens=None, metrics=None):
+        return self.decode(self.run(self.prepare(ids_list, metrics), num_beams, max_new_tokens, metrics), metrics)
+
+    def translate(self, texts, decoding=None):
+        ids = self.encode(texts)
+        return self.generate(ids, **decode_args(decoding, ids))
+
+BACKENDS = ["torch", "ct2"]
+
+class ModelRegistry:
+    """
+    Backend già caricati, condivisi tra anteprima e batch.
+    Chiave (modello, device, precisione, backend); eviction LRU quando si supera il budget di memoria.
+    """
+    def __init__(self, budget_mb=4096):
+        self.budget_mb = budget_mb
+        self.models = OrderedDict()  # chiave -> backend (con .tokenizer e .mb)
+        self.lock = threading.Lock()
+        self.stats = {"loads": 0, "hits": 0, "misses": 0, "evictions": 0, "load_seconds": 0.0}
+
+    def load(self, name, device, precision, backend="torch"):
+        tokenizer = MarianTokenizer.from_pretrained(name)
+        if backend == "ct2":
+            if not CT2_AVAILABLE: raise RuntimeError("Backend ct2 non disponibile: pip install ctranslate2")
+            translator, path = load_ct2_translator(name, device, precision)
+            gen = GenerationConfig.from_pretrained(name)
+            return CT2Backend(tokenizer, translator, path, beam_size=gen.num_beams or 1, max_length=gen.max_length or 512)
+        if backend != "torch": raise ValueError(f"Backend sconosciuto: {backend}")
+        if precision == "int8": return TorchBackend(tokenizer, load_int8_model(name), device)
+        model = MarianMTModel.from_pretrained(name).to(device)
+        if precision == "fp16": model = model.half()
+        return TorchBackend(tokenizer, model, device)
+
+    def get(self, name, device="cpu", precision="fp32", backend="torch"):
+        key = (name, device, precision, backend)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.models[key]
+            self.stats["misses"] += 1
+            t = time.time()
+            be = self.load(name, device, precision, backend)
+            self.stats["loads"] += 1
+            self.stats["load_seconds"] += time.time() - t
+            self.models[key] = be
+            self._evict()
+            return be
+
+    def _evict(self):
+        # Il modello appena usato resta sempre, anche se da solo supera il budget
+        while len(self.models) > 1 and self.used_mb() > self.budget_mb:
+            self.models.popitem(last=False)
+            self.stats["evictions"] += 1
+        if torch.cuda.is_available(): torch.cuda.empty_cache()
+
+    def used_mb(self):
+        return sum(be.mb for be in self.models.values())
+
+    def clear(self):
+        with self.lock:
+            self.stats["evictions"] += len(self.models)
+            self.models.clear()
+            if torch.cuda.is_available(): torch.cuda.empty_cache()
+
+    def summary(self):
+        st = self.stats
+        return (f"{len(self.models)} modelli in RAM ({self.used_mb():.0f}/{self.budget_mb} MB) - "
+                f"load {st['loads']} ({st['load_seconds']:.1f}s), hit {st['hits']}, miss {st['misses']}, evict {st['evictions']}")
+
+MODEL_REGISTRY = ModelRegistry()
+
+# --- INFERENZA MULTI-PROCESSO (CPU) ---
+# Stato del processo worker: un backend per processo, caricato dall'initializer.
+# I checkpoint safetensors vengono letti in mmap, quindi le pagine dei pesi su disco
+# sono condivise dalla page cache tra i processi finché non vengono convertite.
+_WORKER = {}
+
+def _infer_worker_init(name, precision, backend, threads, decoding):
+    torch.set_num_threads(threads)
+    _WORKER["backend"] = MODEL_REGISTRY.get(name, "cpu", precision, backend)
+    _WORKER["decoding"] = decoding
+
+def _infer_worker_batch(ids_list):
+    """(testi tradotti, token generati): i token servono ai token/s del processo principale."""
+    metrics = RunMetrics()
+    res = _WORKER["backend"].generate(ids_list, metrics=metrics, **decode_args(_WORKER["decoding"], ids_list))
+    return res, metrics.counters.get("tokens_out", 0)
+
+MAX_BATCH_ROWS = 256
+PIPELINE_DEPTH = 2  # batch in coda tra preparazione, generate e decode
+
+def plan_batches(lengths, max_tokens, max_rows=MAX_BATCH_ROWS):
+    """
+    Divide gli indici in batch ordinati per lunghezza (dal più lungo).
+    Ogni batch rispetta il budget di token *con padding* (righe x lunghezza massima),
+    così le frasi corte non vengono allungate da un singolo paragrafo.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    cur = []
+    cur_max = 0
+    for i in order:
+        new_max = max(cur_max, lengths[i])
+        if cur and (new_max * (len(cur) + 1) > max_tokens or len(cur) >= max_rows):
+            batches.append(cur)
+            cur = []
+            new_max = lengths[i]
+        cur.append(i)
+        cur_max = new_max
+    if cur: batches.append(cur)
+    return batches
+
+# Fine frase: punteggiatura (+ eventuali virgolette/parentesi chiuse), spazi, poi l'inizio di
+# una nuova frase (maiuscola, cifra o placeholder). I placeholder __X_n_X__ non contengono
+# punteggiatura, quindi non vengono mai spezzati.
+SENTENCE_END_RE = re.compile(r'[.!?…]+["”»\')\]]*(\s+)(?=["“«\'(\[¡¿]?(?:[A-ZÀ-ÖØ-Þ]|\d|__X_))')
+# Un punto singolo dopo un'abbreviazione comune o un'iniziale maiuscola ("Mr. Smith",
+# "e.g. The", "J. R. R. Tolkien") non chiude la frase. Si guarda solo la coda prima del punto.
+ABBREV_RE = re.compile(r'(?:^|[^\w.])(?:Mr|Mrs|Ms|Dr|Prof|St|Mt|Jr|Sr|Lt|Sgt|Capt|Gen|Col|No|vs|'
+                       r'Sig|Sigg|Dott|Ing|Avv|e\.g|i\.e|cf|[A-ZÀ-ÖØ-Þ])$')
+ABBREV_TAIL = 8
+
+def split_segments(text):
+    """Divide un testo mascherato in frasi: [(frase, separatore)], con "".join(f + s) == text."""
+    parts = []
+    start = 0
+    for m in SENTENCE_END_RE.finditer(text):
+        if m.group(0).startswith(".") and not m.group(0).startswith("..") \
+                and ABBREV_RE.search(text[max(start, m.start() - ABBREV_TAIL):m.start()]):
+            continue
+        parts.append((text[start:m.start(1)], m.group(1)))
+        start = m.end(1)
+    parts.append((text[start:], ""))
+    return parts
+
+STREAM_CHUNK_ROWS = 50000
+MODEL_TEMPLATE = "Helsinki-NLP/opus-mt-{src}-{tgt}"
+
+# Opzioni di default per LocalizationEngine (stesse chiavi usate da CLI e GUI)
+DEFAULT_RUN_OPTIONS = {
+    "col": "Text",
+    "src": "en",
+    "tgt": "it",         # una lingua o più ("it,fr,es" / lista): un _FINAL.csv per lingua
+    "model": MODEL_TEMPLATE,
+    "fp16": False,
+    "int8": False,       # CPU Turbo: modello quantizzato int8 (solo CPU)
+    "backend": "torch",  # runtime di inferenza: "torch" o "ct2" (CTranslate2, conversione una tantum)
+    "decoding": "Quality",  # profilo di DECODING_PROFILES: Fast (greedy), Balanced, Quality
+    "pipeline": True,    # tokenize / generate / decode sovrapposti su tre thread
+    "sheet": None,       # foglio da tradurre negli .xlsx (None = il primo)
+    "xlsx_output": True, # .xlsx in ingresso -> _FINAL.xlsx con gli altri fogli (False = _FINAL.csv)
+    "infer_workers": 1,  # >1: processi di inferenza su CPU, ognuno con il suo modello (solo modelli caricabili per nome/cartella)
+    "segment": False,    # traduce frase per frase le celle lunghe (dedup e cache a livello di frase)
+    "normalize": False,  # chiavi normalizzate: spazi compattati, numeri (TEMPLATE_PATTERNS) in placeholder
+    "metrics_path": None,  # report JSON dei tempi per stadio ("auto" = run_metrics.json accanto al primo output)
+    "prometheus": False,   # anche il file .prom (formato testo Prometheus) accanto al report JSON
+    "cpu_threads": None, # thread intra-op di torch (None = core disponibili)
+    "safety": True,
+    "debug_col": True,
+    "online": False,
+    "len_check": True,
+    "skip_existing": True,
+    "auto_punct": True,
+    "max_tokens": None,  # budget token per batch (None = automatico in base al device)
+    "tm": True,          # memoria di traduzione persistente
+    "tm_path": TM_FILE,
+    "shard_workers": 1,  # processi per mask su file grandi (>= SHARD_MIN_ROWS righe)
+    "glossary_whole_words": False,
+    "stream_rows": 0,    # >0: CSV letti e scritti a chunk di N righe (memoria costante)
+    "online_workers": 4,  # fallback online: richieste in parallelo
+    "online_rate": 5.0,   # fallback online: richieste al secondo (0 = senza limite)
+    "online_retries": 3,
+    "online_url": None,   # endpoint LibreTranslate al posto di Google (self-hosted o server di test locale)
+}
+
+def run_precision(device, fp16=False, int8=False):
+    """Precisione del modello: int8 solo su CPU, fp16 solo su CUDA (stessa regola per batch e anteprima)."""
+    if device == "cpu" and int8: return "int8"
+    return "fp16" if fp16 and device == "cuda" else "fp32"
+
+class LocalizationEngine:
+    """
+    Pipeline di traduzione senza GUI:
+    lettura -> mask -> dedup -> generate -> unmask -> QA -> glossario -> scrittura.
+    Usata sia da TranslatorApp che dalla riga di comando.
+    """
+    def __init__(self, processor=None, options=None, glossary=None, log=None, on_progress=None,
+                 stop_event=None, pause_event=None, registry=None):
+        if processor is None:
+            # Come da riga di comando: senza pattern i codici di gioco arriverebbero al modello in chiaro
+            processor = TextProcessor()
+            processor.update_patterns(DEFAULT_PATTERNS)
+        self.processor = processor
+        self.registry = registry or MODEL_REGISTRY
+        self.opts = dict(DEFAULT_RUN_OPTIONS)
+        self.opts.update(options or {})
+        self.glossary_dict = glossary or {}
+        self.glossary = None
+        self.log = log or (lambda msg: print(f"> {msg}"))
+        self.on_progress = on_progress or (lambda frac, speed: None)
+        self.stop_event = stop_event or threading.Event()
+        if pause_event is None:
+            pause_event = threading.Event()
+            pause_event.set()
+        self.pause_event = pause_event
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.tokenizer = None
+        self.backend = None
+        self.model_key = None
+        self.tm = None
+        self.metrics = RunMetrics()
+        self.pool = None
+        self.pool_key = None
+        self.tgt = self.targets[0]
+
+    @property
+    def targets(self):
+        """Lingue di destinazione: "it", "it,fr,es" oppure una lista."""
+        t = self.opts["tgt"]
+        if isinstance(t, str): t = t.split(",")
+        return [x.strip() for x in t if x.strip()]
+
+    @property
+    def model_name(self):
+        return self.opts["model"].format(src=self.opts["src"], tgt=self.tgt)
+
+    @property
+    def variant(self):
+        """
+        Backend, precisione e profilo di decoding quando non sono quelli di default
+        (torch/fp32/Quality): separano memoria di traduzione e journal, così l'output di un run
+        int8 o greedy (Fast) non finisce nelle risposte di un run a piena qualità.
+        """
+        parts = []
+        if self.opts["backend"] != "torch": parts.append(self.opts["backend"])
+        if self.precision != "fp32": parts.append(self.precision)
+        if self.opts["decoding"] != "Quality": parts.append(self.opts["decoding"])
+        return parts
+
+    @property
+    def cache_model(self):
+        """Modello per la memoria di traduzione: "nome[@backend][@precisione][@decoding]"."""
+        return "@".join([self.model_name] + self.variant)
+
+    def use_target(self, tgt):
+        self.tgt = tgt
+        if self.model_key != (self.model_name, self.device, self.precision, self.opts["backend"]): self.load_model()
+
+    @property
+    def fp16(self):
+        return bool(self.opts["fp16"]) and self.device == "cuda"
+
+    @property
+    def precision(self):
+        return run_precision(self.device, self.opts["fp16"], self.opts["int8"])
+
+    def load_model(self):
+        if self.device == "cpu":
+            torch.set_num_threads(int(self.opts["cpu_threads"] or cpu_threads()))
+        self.log(f"Caricamento {self.model_name}...")
+        with self.metrics.stage("load_model"):
+            self.backend = self.registry.get(self.model_name, self.device, self.precision, self.opts["backend"])
+        self.tokenizer = self.backend.tokenizer
+        self.model_key = (self.model_name, self.device, self.precision, self.opts["backend"])
+        self.log(f"Modelli: {self.registry.summary()}")
+
+    def translate_ids(self, ids_list):
+        """input_ids già tokenizzati -> testi tradotti (padding solo al batch)."""
+        self.metrics.batch([len(x) for x in ids_list])
+        return self.backend.generate(ids_list, metrics=self.metrics, **decode_args(self.opts["decoding"], ids_list))
+
+    @property
+    def infer_workers(self):
+        return max(1, int(self.opts["infer_workers"] or 1)) if self.device == "cpu" else 1
+
+    def worker_pool(self):
+        """Pool di processi per il modello corrente; i thread di torch vengono divisi tra i worker."""
+        key = self.model_key + (self.infer_workers, self.opts["decoding"])
+        if self.pool is not None and self.pool_key == key: return self.pool
+        self.close_pool()
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        threads = max(1, int(self.opts["cpu_threads"] or cpu_threads()) // self.infer_workers)
+        # spawn anche su Linux: fork dopo l'avvio dei thread OpenMP di torch può bloccarsi
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.infer_workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_infer_worker_init,
+            initargs=(self.model_name, self.precision, self.opts["backend"], threads, self.opts["decoding"]))
+        self.pool_key = key
+        self.log(f"Inferenza su {self.infer_workers} processi ({threads} thread ciascuno).")
+        return self.pool
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+            self.pool_key = None
+
+    def translate_parallel(self, batches, enc, store):
+        """
+        Data-parallel su più processi: i batch (già ordinati per lunghezza) vengono assegnati
+        dinamicamente, al massimo 2 per worker in volo, così i processi liberi prendono subito
+        il successivo e stop/pausa hanno effetto entro pochi batch. I risultati tornano per
+        indice di batch, quindi l'ordine di completamento non conta.
+        """
+        from concurrent.futures import wait, FIRST_COMPLETED
+        pool = self.worker_pool()
+        pending = {}
+        queue_iter = iter(batches)
+
+        def submit():
+            idxs = next(queue_iter, None)
+            if idxs is None: return
+            ids_list = [enc[i] for i in idxs]
+            self.metrics.batch([len(x) for x in ids_list])
+            pending[pool.submit(_infer_worker_batch, ids_list)] = idxs
+
+        for _ in range(2 * self.infer_workers): submit()
+        with self.metrics.stage("generate_parallel", len(enc)):
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    idxs = pending.pop(fut)
+                    try:
+                        res, out_tokens = fut.result()
+                        self.metrics.add("tokens_out", out_tokens)
+                    except:
+                        res = None
+                    store(idxs, res)
+                    if not self.stop_event.is_set():
+                        self.pause_event.wait()
+                        submit()
+
+    def compare_workers(self, texts, sample=400):
+        """Frasi/s con un solo processo e con infer_workers processi sullo stesso campione."""
+        rnd = random.Random(0)
+        texts = [t for t in dict.fromkeys(str(x) for x in texts) if t.strip()]
+        texts = rnd.sample(texts, min(sample, len(texts)))
+        masked = [self.processor.mask(t)[0] for t in texts]
+        self.use_target(self.tgt)
+        enc = self.backend.encode(masked)
+        batches = plan_batches([len(x) for x in enc], self.max_tokens)
+        outputs = {}
+        speed = {}
+        for mode in ("single", "parallel"):
+            res = [None] * len(masked)
+
+            def store(idxs, r):
+                for i, x in zip(idxs, r or [masked[i] for i in idxs]): res[i] = x
+            if mode == "parallel":
+                # Avvio dei processi e caricamento dei modelli fuori dalla misura
+                pool = self.worker_pool()
+                list(pool.map(_infer_worker_batch, [[enc[i] for i in b] for b in batches[:self.infer_workers]]))
+            t = time.time()
+            if mode == "single":
+                for idxs in batches: store(idxs, self.translate_ids([enc[i] for i in idxs]))
+            else:
+                self.translate_parallel(batches, enc, store)
+            speed[mode] = len(masked) / max(time.time() - t, 1e-9)
+            outputs[mode] = res
+        self.close_pool()
+        same = sum(a == b for a, b in zip(outputs["single"], outputs["parallel"]))
+        report = {
+            "sample": len(masked),
+            "workers": self.infer_workers,
+            "single_per_s": round(speed["single"], 2),
+            "parallel_per_s": round(speed["parallel"], 2),
+            "speedup": round(speed["parallel"] / speed["single"], 2) if speed["single"] else None,
+            "agreement": round(same / len(masked), 4) if masked else None,
+        }
+        self.log(f"Multi-processo: 1 processo {report['single_per_s']}/s, {report['workers']} processi "
+                 f"{report['parallel_per_s']}/s (x{report['speedup']})")
+        return report
+
+    def compare_int8(self, texts, sample=200):
+        """Confronto fp32 vs int8 su un campione: frasi/s di entrambi e % di output identici."""
+        rnd = random.Random(0)
+        texts = [t for t in dict.fromkeys(str(x) for x in texts) if t.strip()]
+        texts = rnd.sample(texts, min(sample, len(texts)))
+        masked = [self.processor.mask(t)[0] for t in texts]
+        if self.device == "cpu": torch.set_num_threads(int(self.opts["cpu_threads"] or cpu_threads()))
+        outputs = {}
+        speed = {}
+        for precision in ("fp32", "int8"):
+            self.backend = self.registry.get(self.model_name, "cpu", precision, self.opts["backend"])
+            self.tokenizer = self.backend.tokenizer
+            enc = self.backend.encode(masked)
+            res = [None] * len(masked)
+            t = time.time()
+            for idxs in plan_batches([len(x) for x in enc], self.max_tokens):
+                for i, r in zip(idxs, self.translate_ids([enc[i] for i in idxs])): res[i] = r
+            speed[precision] = len(masked) / max(time.time() - t, 1e-9)
+            outputs[precision] = res
+        self.model_key = None  # il prossimo use_target ricarica il modello giusto
+        same = sum(a == b for a, b in zip(outputs["fp32"], outputs["int8"]))
+        report = {
+            "sample": len(masked),
+            "fp32_per_s": round(speed["fp32"], 2),
+            "int8_per_s": round(speed["int8"], 2),
+            "speedup": round(speed["int8"] / speed["fp32"], 2) if speed["fp32"] else None,
+            "agreement": round(same / len(masked), 4) if masked else None,
+        }
+        self.log(f"CPU Turbo: fp32 {report['fp32_per_s']}/s, int8 {report['int8_per_s']}/s "
+                 f"(x{report['speedup']}), output identici {report['agreement']}")
+        return report
+
+    @property
+    def max_tokens(self):
+        if self.opts["max_tokens"]: return int(self.opts["max_tokens"])
+        if self.device == "cpu": return 2048
+        return 16384 if self.fp16 else 8192
+
+    def translate_unique(self, todo, cache, journal):
+        # Tokenizziamo una volta sola: le lunghezze servono per ordinare e dividere i batch
+        with self.metrics.stage("tokenize", len(todo)):
+            enc = self.backend.encode(todo) if todo else []
+        batches = plan_batches([len(x) for x in enc], self.max_tokens)
+
+        start_t = time.time()
+        proc = 0
+        tokens = 0
+
+        def store(idxs, res):
+            """Risultato di un batch -> cache, journal, memoria, avanzamento (res None = batch fallito)."""
+            nonlocal proc, tokens
+            batch = [todo[i] for i in idxs]
+            try:
+                if res is None: raise RuntimeError("batch fallito")
+                for s, r in zip(batch, res): cache[s] = r
+                with self.metrics.stage("checkpoint", len(batch)):
+                    journal.append(zip(batch, res))
+                    if self.tm: self.tm.store(self.cache_model, self.opts["src"], self.tgt, zip(batch, res))
+                tokens += sum(len(enc[i]) for i in idxs)
+                self.metrics.add("translated", len(batch))
+            except:
+                for s in batch: cache[s] = s
+
+            proc += len(batch)
+            elapsed = time.time() - start_t
+            self.on_progress(proc/len(todo), proc/elapsed if elapsed > 0 else None)
+
+        if self.infer_workers > 1 and len(batches) > 1:
+            self.translate_parallel(batches, enc, store)
+        elif self.opts["pipeline"] and len(batches) > 1:
+            self.translate_pipelined(batches, enc, store)
+        else:
+            for idxs in batches:
+                if self.stop_event.is_set(): break
+                self.pause_event.wait()
+                try:
+                    res = self.translate_ids([enc[i] for i in idxs])
+                except:
+                    res = None
+                store(idxs, res)
+
+        if proc:
+            elapsed = max(time.time() - start_t, 1e-9)
+            self.log(f"Decoding {self.opts['decoding']} ({self.opts['backend']}): {tokens} token sorgente in "
+                     f"{elapsed:.1f}s = {tokens/elapsed:.0f} token/s")
+
+    def translate_pipelined(self, batches, enc, store):
+        """
+        Tre stadi sovrapposti: un thread prepara i batch successivi (padding, tensori sul device),
+        questo thread fa solo generate, un terzo decodifica e chiama store (cache/journal/memoria).
+        Le code limitate a PIPELINE_DEPTH fanno da backpressure. Ogni stadio svuota la sua coda
+        fino al segnale di fine, quindi uno stop non blocca mai un produttore: i batch già
+        preparati vengono scartati, quelli già generati vengono comunque salvati.
+        """
+        backend = self.backend
+        decoding = self.opts["decoding"]
+        prepared = queue.Queue(maxsize=PIPELINE_DEPTH)
+        generated = queue.Queue(maxsize=PIPELINE_DEPTH)
+        done = object()
+
+        def produce():
+            try:
+                for idxs in batches:
+                    if self.stop_event.is_set(): break
+                    self.pause_event.wait()
+                    try:
+                        inputs = backend.prepare([enc[i] for i in idxs], self.metrics)
+                    except:
+                        inputs = None
+                    prepared.put((idxs, inputs))
+            finally:
+                prepared.put(done)
+
+        def write():
+            while True:
+                item = generated.get()
+                if item is done: return
+                idxs, out = item
+                try:
+                    res = backend.decode(out, self.metrics) if out is not None else None
+                except:
+                    res = None
+                store(idxs, res)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        writer = threading.Thread(target=write, daemon=True)
+        producer.start()
+        writer.start()
+        try:
+            while True:
+                item = prepared.get()
+                if item is done: break
+                idxs, inputs = item
+                if self.stop_event.is_set(): continue
+                self.pause_event.wait()
+                out = None
+                if inputs is not None:
+                    ids_list = [enc[i] for i in idxs]
+                    try:
+                        self.metrics.batch([len(x) for x in ids_list])
+                        out = backend.run(inputs, metrics=self.metrics, **decode_args(decoding, ids_list))
+                    except:
+                        out = None
+                generated.put((idxs, out))
+        finally:
+            generated.put(done)
+            writer.join()
+
+    def online_fallback(self, texts):
+        """Traduce online le frasi che non passano il Safety Check. Ritorna {testo: traduzione}."""
+        client = OnlineFallback(self.opts["src"], self.tgt, workers=self.opts["online_workers"],
+                                rate=self.opts["online_rate"], retries=self.opts["online_retries"],
+                                base_url=self.opts["online_url"])
+        res = client.translate_many(texts)
+        self.log(f"Fallback online: {len(res)} frasi, {client.requests} richieste, {client.errors} errori.")
+        return {t: r for t, r in res.items() if r is not None}
+
+    def assemble(self, df, cache):
+        """
+        Unmask + QA a colonne. Il lavoro si fa una volta per testo sorgente unico
+        e si ridistribuisce sulle righe; le righe saltate sono gestite da una maschera.
+        Ritorna (testi finali, status categorici, righe fallite).
+        """
+        col = self.opts["col"]
+        use_online = self.opts["online"] and (ONLINE_AVAILABLE or bool(self.opts["online_url"]))
+        workers = self.opts["shard_workers"]
+        proc = self.processor
+
+        src_all = df[col].to_numpy(dtype=object)
+        final_all = src_all.copy()
+        status_all = np.full(len(df), STATUS_CODES.index("SKIPPED"), dtype=np.int8)
+        if self.opts["skip_existing"]:
+            work = (df[col] == "").to_numpy(dtype=bool, na_value=False)
+        else:
+            work = np.ones(len(df), dtype=bool)
+        rows = np.flatnonzero(work)
+        failed_indices = []
+        if not len(rows):
+            return final_all, pd.Categorical.from_codes(status_all, STATUS_CODES), failed_indices
+
+        codes, _ = pd.factorize(src_all[rows])
+        first = np.unique(codes, return_index=True)[1]
+        src_u = [str(x) for x in src_all[rows[first]]]
+        masked_u = df['Masked'].to_numpy(dtype=object)[rows[first]]
+        ph_u = df['Placeholders'].to_numpy(dtype=object)[rows[first]]
+
+        # mask -> unmask è l'identità, salvo testi che contengono già un placeholder letterale
+        orig_u = [s if "__X_" not in s else proc.unmask(m, p) for s, m, p in zip(src_u, masked_u, ph_u)]
+        trans_u = [cache.get(m, m) for m in masked_u]
+        final_u = shard_map(proc.unmask, trans_u, ph_u, workers=workers)
+        # Righe non tradotte (stop a metà): la cella originale, non la sua forma normalizzata
+        final_u = [f if m in cache else o for m, o, f in zip(masked_u, orig_u, final_u)]
+        if self.opts["normalize"]:
+            # Gli spazi ai bordi tolti dalla normalizzazione tornano quelli della cella originale
+            final_u = [o[:len(o) - len(o.lstrip())] + f.strip() + o[len(o.rstrip()):] if o.strip() else f
+                       for o, f in zip(orig_u, final_u)]
+        if self.opts["auto_punct"]:
+            final_u = pd.Series(final_u, dtype=object).str.replace(PUNCT_RE, r'\1', regex=True).tolist()
+
+        status_u = np.full(len(final_u), STATUS_CODES.index("OK"), dtype=np.int8)
+        if self.opts["safety"]:
+            checks = shard_map(proc.safety_check, orig_u, final_u, workers=workers)
+            # Un placeholder perso dal modello (es. un numero della normalizzazione) sparirebbe
+            # in silenzio: safety_check vede solo le variabili protette
+            kept = shard_map(proc.has_placeholders, trans_u, ph_u, workers=workers)
+            bad = [i for i, ((ok, _), k) in enumerate(zip(checks, kept)) if not (ok and k)]
+            # Fallback online come stadio separato: tutte le frasi fallite in un colpo solo
+            online = self.online_fallback([orig_u[i] for i in bad]) if bad and use_online else {}
+            for i in bad:
+                fb = online.get(orig_u[i])
+                if fb is not None and proc.safety_check(orig_u[i], fb)[0]:
+                    final_u[i] = fb
+                    status_u[i] = STATUS_CODES.index("ONLINE")
+                else:
+                    final_u[i] = orig_u[i]
+                    status_u[i] = STATUS_CODES.index("SAFETY_FAIL")
+
+        if self.opts["len_check"]:
+            orig_len = np.fromiter((len(x) for x in orig_u), dtype=np.int64, count=len(orig_u))
+            final_len = np.fromiter((len(x) for x in final_u), dtype=np.int64, count=len(final_u))
+            ok_or_online = (status_u == STATUS_CODES.index("OK")) | (status_u == STATUS_CODES.index("ONLINE"))
+            # OK -> OK_LEN, ONLINE -> ONLINE_LEN (codi adiacenti in STATUS_CODES)
+            status_u[ok_or_online & (final_len > orig_len * 1.3)] += 1
+
+        final_all[rows] = np.array(final_u, dtype=object)[codes]
+        status_all[rows] = status_u[codes]
+
+        for j in np.flatnonzero(status_u[codes] == STATUS_CODES.index("SAFETY_FAIL")):
+            orig = orig_u[codes[j]]
+            failed_indices.append({'idx': df.index[rows[j]], 'orig': orig, 'trans': orig})
+
+        return final_all, pd.Categorical.from_codes(status_all, STATUS_CODES), failed_indices
+
+    def output_path(self, fpath):
+        ext = "xlsx" if fpath.endswith('.xlsx') and self.opts["xlsx_output"] else "csv"
+        return fpath.rsplit('.', 1)[0] + f"_{self.tgt}_FINAL.{ext}"
+
+    def journal_path(self, fpath):
+        return ".".join([fpath, self.tgt] + self.variant + ["journal.jsonl"])
+
+    def prepare_frame(self, df, report):
+        """Parte indipendente dalla lingua: mojibake, mask e set di stringhe uniche. Si fa una volta per file."""
+        col = self.opts["col"]
+        rows_to_do = []
+        if self.opts["skip_existing"]:
+            rows_to_do = (df[col] == "") | (df[col].isna())
+            report["skipped"] += int(len(df) - rows_to_do.sum())
+        else:
+            rows_to_do = [True] * len(df)
+
+        with self.metrics.stage("mojibake", len(df)):
+            df.loc[rows_to_do, col] = df.loc[rows_to_do, col].apply(self.processor.fix_mojibake)
+        # Un record (mascherato, placeholders) per riga, salvato a colonne accanto al DataFrame
+        mask = self.processor.mask_canonical if self.opts["normalize"] else self.processor.mask
+        with self.metrics.stage("mask", len(df)):
+            records = shard_map(mask, df[col].tolist(), workers=self.opts["shard_workers"])
+            df['Masked'] = [r[0] for r in records]
+            df['Placeholders'] = [r[1] for r in records]
+
+        with self.metrics.stage("dedup", len(df)):
+            unique = [t for t in list(df.loc[rows_to_do, 'Masked'].unique()) if str(t).strip()]
+        return df, unique
+
+    def translate_frame(self, df, unique, cache, journal, report, fpath):
+        """Parte per lingua (self.tgt): traduzione -> assemblaggio/QA -> glossario -> regex."""
+        col = self.opts["col"]
+        segments = {}
+        if self.opts["segment"]:
+            # Cella -> frasi; si traducono (e si mettono in cache/memoria) le frasi uniche
+            segments = {t: split_segments(t) for t in unique}
+            segments = {t: p for t, p in segments.items() if len(p) > 1}
+            units = list(dict.fromkeys(seg for t in unique for seg, _ in segments.get(t, [(t, "")]) if seg.strip()))
+            self.log(f"Segmentazione: {len(unique)} celle -> {len(units)} frasi uniche.")
+        else:
+            units = unique
+        todo = [t for t in units if t not in cache]
+        self.metrics.add("units", len(units))
+        self.metrics.add("journal_hits", len(units) - len(todo))
+        if self.tm and todo:
+            with self.metrics.stage("tm_lookup", len(todo)):
+                hits = self.tm.lookup(self.cache_model, self.opts["src"], self.tgt, todo)
+            self.metrics.add("tm_hits", len(hits))
+            if hits:
+                cache.update(hits)
+                todo = [t for t in todo if t not in hits]
+            self.log(f"Memoria: {len(hits)} trovate, {len(todo)} da tradurre.")
+        try:
+            self.translate_unique(todo, cache, journal)
+        finally:
+            journal.close()
+
+        for t, parts in segments.items():
+            # Cella ricomposta solo se tutte le frasi sono tradotte (dopo uno stop resta l'originale)
+            if all(seg in cache or not seg.strip() for seg, _ in parts):
+                cache[t] = "".join(cache.get(seg, seg) + sep for seg, sep in parts)
+
+        with self.metrics.stage("assemble", len(df)):
+            final_texts, statuses, failed = self.assemble(df, cache)
+        report["translated"] += int((statuses != "SKIPPED").sum())
+        report["failed"].extend(dict(r, file=fpath, tgt=self.tgt) for r in failed)
+
+        df[col] = final_texts
+        if self.opts["debug_col"]: df['QA_Status'] = statuses
+
+        if self.glossary:
+            with self.metrics.stage("glossary", len(df)):
+                df[col] = self.glossary.apply_series(df[col])
+
+        if self.processor.regex_rules:
+            with self.metrics.stage("regex", len(df)):
+                df[col] = df[col].apply(self.processor.apply_regex_rules)
+
+        df.drop(columns=['Masked', 'Placeholders'], inplace=True, errors='ignore')
+        return df
+
+    def process_frame(self, df, cache, journal, report, fpath):
+        df, unique = self.prepare_frame(df, report)
+        return self.translate_frame(df, unique, cache, journal, report, fpath)
+
+    def process_file(self, fpath, report):
+        col = self.opts["col"]
+        self.log(f"File: {os.path.basename(fpath)}")
+        targets = self.targets
+        if self.opts["stream_rows"] and fpath.endswith('.csv'):
+            # In streaming la memoria ha la priorità: una passata sul file per lingua
+            for n, tgt in enumerate(targets):
+                if n > 0 and self.stop_event.is_set(): break
+                self.use_target(tgt)
+                self.process_file_streaming(fpath, report)
+            return
+
+        t = time.perf_counter()
+        with self.metrics.stage("read"):
+            df = DATASETS.take(fpath, self.opts["sheet"])  # il run è l'ultimo a usarlo: niente copia
+        self.metrics.add_items("read", len(df))
+        if fpath.endswith('.xlsx'):
+            self.log(f"Excel: {len(df)} righe lette in {time.perf_counter() - t:.1f}s ({excel_engine()})")
+        if col not in df.columns:
+            self.log(f"Colonna '{col}' non trovata, file saltato.")
+            return
+
+        # Testi originali: l'Excel in uscita riscrive solo le celle che la traduzione ha cambiato
+        src_texts = df[col].tolist() if fpath.endswith('.xlsx') else None
+        # Lettura, pulizia, mask e dedup una volta sola, poi un modello per lingua
+        df, unique = self.prepare_frame(df, report)
+        for n, tgt in enumerate(targets):
+            if n > 0 and self.stop_event.is_set(): break
+            self.use_target(tgt)
+            if len(targets) > 1: self.log(f"Lingua: {tgt} ({n+1}/{len(targets)})")
+            journal = CheckpointJournal(self.journal_path(fpath))
+            cache = journal.replay()
+            if cache: self.log(f"Ripresa: {len(cache)} traduzioni dal journal.")
+
+            out_df = self.translate_frame(df.copy() if n < len(targets) - 1 else df, unique, cache, journal, report, fpath)
+            out = self.output_path(fpath)
+            t = time.perf_counter()
+            with self.metrics.stage("write", len(out_df)):
+                if out.endswith('.xlsx'):
+                    write_excel(out, fpath, col, out_df[col], src_texts, self.opts["sheet"],
+                                out_df['QA_Status'] if 'QA_Status' in out_df else None)
+                else:
+                    out_df.to_csv(out, sep=';', index=False, encoding='utf-8-sig', quoting=csv.QUOTE_MINIMAL)
+            if out.endswith('.xlsx'):
+                self.log(f"Excel: {len(out_df)} righe salvate in {time.perf_counter() - t:.1f}s")
+            self.finish_file(out, journal, report)
+
+    def process_file_streaming(self, fpath, report):
+        """
+        Versione a chunk per CSV enormi: si leggono stream_rows righe alla volta e ogni chunk
+        finito viene accodato subito al _FINAL.csv, quindi la memoria non cresce con il file.
+        La deduplicazione resta globale: con la memoria di traduzione attiva le traduzioni
+        vivono nel database (lookup a blocchi), altrimenti nel dizionario cache.
+        """
+        col = self.opts["col"]
+        journal = CheckpointJournal(self.journal_path(fpath))
+        cache = journal.replay()
+        if cache: self.log(f"Ripresa: {len(cache)} traduzioni dal journal.")
+
+        out = self.output_path(fpath)
+        reader = DATASETS.handle(fpath).chunks(int(self.opts["stream_rows"]))
+        rows = 0
+        chunks = iter(reader)
+        with self.metrics.stage("read"):
+            chunk = next(chunks, None)
+        if chunk is not None:
+            chunk.columns = chunk.columns.str.strip()
+            if col not in chunk.columns:
+                self.log(f"Colonna '{col}' non trovata, file saltato.")
+                return
+        # Ogni chunk finito va subito nel _FINAL.csv (le prime righe compaiono presto); la sicurezza
+        # in caso di crash la dà il journal: alla ripresa il file viene riscritto da capo senza ritradurre
+        with open(out, 'w', encoding='utf-8-sig', newline='') as f:
+            for n in itertools.count():
+                if n > 0:
+                    with self.metrics.stage("read"):
+                        chunk = next(chunks, None)
+                    if chunk is not None: chunk.columns = chunk.columns.str.strip()
+                if chunk is None: break
+                self.metrics.add_items("read", len(chunk))
+                # Anche dopo uno stop si scrivono tutti i chunk (senza tradurli), come nel caso non-streaming
+                chunk = self.process_frame(chunk, cache, journal, report, fpath)
+                with self.metrics.stage("write", len(chunk)):
+                    chunk.to_csv(f, sep=';', index=False, header=(n == 0), quoting=csv.QUOTE_MINIMAL)
+                    f.flush()
+                rows += len(chunk)
+                self.log(f"Chunk {n+1}: {rows} righe scritte.")
+                if self.tm: cache.clear()
+        self.finish_file(out, journal, report)
+
+    def finish_file(self, out, journal, report):
+        self.log(f"Salvato: {os.path.basename(out)}")
+        report["outputs"].append(out)
+        # Su SALVA E STOP il journal resta (compattato) per riprendere al prossimo avvio
+        if self.stop_event.is_set(): journal.compact()
+        else: journal.discard()
+
+    def run(self, files):
+        """Traduce la lista di file. Ritorna un report con contatori e righe fallite."""
+        report = {"translated": 0, "skipped": 0, "failed": [], "outputs": []}
+        self.metrics = RunMetrics()
+        if self.glossary_dict and self.glossary is None:
+            pattern = self.processor.mask_re.pattern if self.processor.mask_re else None
+            self.glossary = GlossaryEngine(self.glossary_dict, pattern, self.opts["glossary_whole_words"])
+        if self.opts["tm"] and self.tm is None:
+            self.tm = TranslationMemory(self.opts["tm_path"])
+        try:
+            for fpath in files:
+                if self.stop_event.is_set(): break
+                self.process_file(fpath, report)
+        finally:
+            self.close_pool()
+            DATASETS.clear()  # i DataFrame letti in anticipo non servono più
+            if self.tm:
+                self.tm.close()
+                self.tm = None
+        report["stopped"] = self.stop_event.is_set()
+        report["metrics"] = self.metrics.snapshot()
+        self.log(f"Stadi più lenti: {self.metrics.summary()}")
+        self.write_metrics(report)
+        return report
+
+    def write_metrics(self, report):
+        path = self.opts["metrics_path"]
+        if not path: return
+        if path == "auto":
+            if not report["outputs"]: return
+            path = os.path.join(os.path.dirname(os.path.abspath(report["outputs"][0])), "run_metrics.json")
+        try:
+            self.metrics.write_json(path)
+            if self.opts["prometheus"]: self.metrics.write_prometheus(path.rsplit('.', 1)[0] + ".prom")
+            self.log(f"Metriche: {os.path.basename(path)}")
+        except Exception as e:
+            self.log(f"Metriche non salvate: {e}")
+
+UI_POLL_MS = 100       # frequenza con cui la GUI svuota la coda degli eventi dei thread
+UI_LOG_LINES = 2000    # righe tenute nella console (le più vecchie restano solo nel file)
+LOG_FLUSH_SECONDS = 1.0
+
+class BufferedLog:
+    """Log di sessione bufferizzato: le righe si accumulano in memoria e vanno su disco a blocchi."""
+    def __init__(self, path, interval=LOG_FLUSH_SECONDS):
+        self.path = path
+        self.interval = interval
+        self.lines = []
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def write(self, msg):
+        with self.lock: self.lines.append(f"[{datetime.datetime.now()}] {msg}\n")
+
+    def flush(self, force=False):
+        if not force and time.monotonic() - self.last_flush < self.interval: return
+        self.last_flush = time.monotonic()
+        with self.lock: lines, self.lines = self.lines, []
+        if not lines: return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f: f.writelines(lines)
+        except:
+            pass
+
 class FailFixerDialog(ctk.CTkToplevel):
     def __init__(self, parent, failed_rows, callback_save):
         super().__init__(parent)
@@ -211,6 +2078,7 @@ class TranslatorApp(ctk.CTk):
         self.files_queue = []
         self.glossary_dict = {}
         self.protection_config = [d.copy() for d in DEFAULT_PATTERNS]
+        self.template_config = [d.copy() for d in TEMPLATE_PATTERNS]
         self.model_checkboxes = []
         
         self.is_running = False
@@ -239,7 +2107,14 @@ class TranslatorApp(ctk.CTk):
                 f.write(f"--- Session V19 Start: {datetime.datetime.now()} ---\n")
         except: pass
 
+        # Canale thread -> GUI: i worker accodano log e callable, solo il thread Tk tocca i widget
+        self.ui_queue = queue.Queue()
+        self.pending_progress = None  # solo l'ultimo avanzamento conta (coalescing)
+        self.shown_progress = None
+        self.log_file = BufferedLog(LOG_FILE)
+
         self.create_ui()
+        self.after(UI_POLL_MS, self.drain_ui_queue)
         self.after(500, self.load_profiles)
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
@@ -335,6 +2210,10 @@ class TranslatorApp(ctk.CTk):
         self.combo_tgt.grid(row=0, column=2, padx=5, pady=5)
         ctk.CTkLabel(grid, text="A Lingua").grid(row=1, column=2)
 
+        self.entry_extra_tgt = ctk.CTkEntry(grid, placeholder_text="fr,es,de", width=120)
+        self.entry_extra_tgt.grid(row=0, column=3, padx=5, pady=5)
+        ctk.CTkLabel(grid, text="Lingue Extra").grid(row=1, column=3)
+
         self.chk_skip_existing = ctk.CTkCheckBox(card_conf, text="Smart Skip: Non toccare celle già piene", text_color="#55FF55")
         self.chk_skip_existing.select()
         self.chk_skip_existing.pack(anchor="w", padx=20, pady=5)
@@ -360,6 +2239,7 @@ class TranslatorApp(ctk.CTk):
         frame_actions.pack(fill="x", padx=20, pady=10)
         ctk.CTkButton(frame_actions, text="🔄 Scansiona", command=self.scan_models, fg_color="#3498DB").pack(side="left", padx=5, expand=True)
         ctk.CTkButton(frame_actions, text="🗑️ Elimina Selezionati", command=self.delete_selected_models, fg_color="#C0392B").pack(side="left", padx=5, expand=True)
+        ctk.CTkButton(frame_actions, text="♻️ Libera RAM", command=self.clear_model_registry, fg_color="gray").pack(side="left", padx=5, expand=True)
         if not HF_HUB_AVAILABLE:
             ctk.CTkLabel(self.tab_models, text="Libreria mancante.", text_color="red").pack()
 
@@ -413,11 +2293,39 @@ class TranslatorApp(ctk.CTk):
         ctk.CTkButton(card_g, text="Carica Glossario", command=self.load_glossary).pack(side="left", padx=10, pady=10)
         self.lbl_gloss_status = ctk.CTkLabel(card_g, text="0 termini", text_color="orange")
         self.lbl_gloss_status.pack(side="left", padx=10)
+        self.chk_gloss_words = ctk.CTkCheckBox(card_g, text="Solo parole intere")
+        self.chk_gloss_words.pack(side="left", padx=10)
         
         card_p = ctk.CTkFrame(self.tab_settings)
         card_p.pack(fill="x", padx=20, pady=10)
         self.chk_fp16 = ctk.CTkCheckBox(card_p, text="Usa FP16 (Turbo Mode)")
         self.chk_fp16.pack(anchor="w", padx=10, pady=10)
+        row_int8 = ctk.CTkFrame(card_p, fg_color="transparent")
+        row_int8.pack(fill="x")
+        self.chk_int8 = ctk.CTkCheckBox(row_int8, text="CPU Turbo (int8, senza GPU)")
+        self.chk_int8.pack(side="left", padx=10, pady=10)
+        ctk.CTkButton(row_int8, text="Confronta int8 vs fp32", command=self.compare_int8, width=160).pack(side="left", padx=10)
+        row_backend = ctk.CTkFrame(card_p, fg_color="transparent")
+        row_backend.pack(fill="x")
+        ctk.CTkLabel(row_backend, text="Backend:").pack(side="left", padx=10, pady=10)
+        self.combo_backend = ctk.CTkComboBox(row_backend, values=BACKENDS if CT2_AVAILABLE else ["torch"], width=120)
+        self.combo_backend.set("torch")
+        self.combo_backend.pack(side="left", padx=5)
+        ctk.CTkLabel(row_backend, text="Decoding:").pack(side="left", padx=10)
+        self.combo_decoding = ctk.CTkComboBox(row_backend, values=list(DECODING_PROFILES), width=120)
+        self.combo_decoding.set("Quality")
+        self.combo_decoding.pack(side="left", padx=5)
+        self.chk_tm = ctk.CTkCheckBox(card_p, text="Memoria di Traduzione (riusa traduzioni tra file e sessioni)")
+        self.chk_tm.select()
+        self.chk_tm.pack(anchor="w", padx=10, pady=10)
+        self.chk_stream = ctk.CTkCheckBox(card_p, text=f"Streaming CSV (file enormi, {STREAM_CHUNK_ROWS} righe per chunk)")
+        self.chk_stream.pack(anchor="w", padx=10, pady=10)
+        self.chk_segment = ctk.CTkCheckBox(card_p, text="Segmentazione in frasi (dialoghi lunghi, cache per frase)")
+        self.chk_segment.pack(anchor="w", padx=10, pady=10)
+        self.chk_normalize = ctk.CTkCheckBox(card_p, text="Normalizza chiavi (spazi e numeri come variabili: \"5 oro\" = \"12 oro\")")
+        self.chk_normalize.pack(anchor="w", padx=10, pady=10)
+        self.chk_metrics = ctk.CTkCheckBox(card_p, text="Report metriche per stadio (run_metrics.json + .prom accanto all'output)")
+        self.chk_metrics.pack(anchor="w", padx=10, pady=10)
         
         card_r = ctk.CTkFrame(self.tab_settings)
         card_r.pack(fill="x", padx=20, pady=10)
@@ -442,17 +2350,12 @@ class TranslatorApp(ctk.CTk):
         target_col_main = self.combo_col.get()
         self.log("Avvio importazione Reference...")
         
-        threading.Thread(target=self._process_merge, args=(ref_path, col_src, col_tgt, target_col_main)).start()
+        use_fuzzy = bool(self.chk_fuzzy.get()) and FUZZY_AVAILABLE
+        threading.Thread(target=self._process_merge, args=(ref_path, col_src, col_tgt, target_col_main, use_fuzzy)).start()
 
-    def _process_merge(self, ref_path, col_src, col_tgt, col_main):
+    def _process_merge(self, ref_path, col_src, col_tgt, col_main, use_fuzzy):
         try:
-            # Force string type on reference
-            try:
-                df_ref = pd.read_csv(ref_path, sep=';', on_bad_lines='skip', dtype=str, keep_default_na=False)
-            except:
-                df_ref = pd.read_csv(ref_path, sep=None, engine='python', dtype=str, keep_default_na=False)
-            
-            df_ref.columns = df_ref.columns.str.strip()
+            df_ref = read_table(ref_path)
             if col_src not in df_ref.columns or col_tgt not in df_ref.columns:
                 self.log("Errore: Colonne non trovate nel file di riferimento.")
                 return
@@ -462,44 +2365,19 @@ class TranslatorApp(ctk.CTk):
             self.log(f"Caricate {len(ref_dict)} traduzioni dal vecchio file.")
 
             main_path = self.files_queue[0]
-            if main_path.endswith('.csv'):
-                try:
-                    df_main = pd.read_csv(main_path, sep=';', on_bad_lines='skip', dtype=str, keep_default_na=False)
-                except:
-                    df_main = pd.read_csv(main_path, sep=None, engine='python', dtype=str, keep_default_na=False)
-            else:
-                df_main = pd.read_excel(main_path, dtype=str)
-            
-            df_main.columns = df_main.columns.str.strip()
-            
-            matches = 0
-            fuzzy_matches = 0
-            use_fuzzy = self.chk_fuzzy.get() and FUZZY_AVAILABLE
-            new_col_data = []
-            
-            for txt in df_main[col_main].astype(str):
-                txt_clean = str(txt).strip()
-                if txt_clean in ref_dict:
-                    new_col_data.append(ref_dict[txt_clean])
-                    matches += 1
-                elif use_fuzzy and txt_clean:
-                    best_match = process.extractOne(txt_clean, ref_dict.keys(), scorer=fuzz.ratio)
-                    if best_match and best_match[1] > 90:
-                        new_col_data.append(ref_dict[best_match[0]])
-                        fuzzy_matches += 1
-                    else:
-                        new_col_data.append(txt)
-                else:
-                    new_col_data.append(txt)
+            df_main = read_table(main_path)
+            new_col_data, matches, fuzzy_matches, pruned = merge_reference(
+                df_main[col_main].astype(str).tolist(), ref_dict, use_fuzzy)
+            if use_fuzzy: self.log(f"Fuzzy: {fuzzy_matches} match, {pruned} confronti evitati dall'indice.")
 
             df_main[col_main] = new_col_data
             out_path = main_path.replace(".csv", "_MERGED.csv").replace(".xlsx", "_MERGED.csv")
             df_main.to_csv(out_path, sep=';', index=False, encoding='utf-8-sig', quoting=csv.QUOTE_MINIMAL)
             
             self.files_queue[0] = out_path
-            self.lbl_merge_status.configure(text=f"Merge: {matches} esatti, {fuzzy_matches} fuzzy")
+            self.ui_call(self.lbl_merge_status.configure, text=f"Merge: {matches} esatti, {fuzzy_matches} fuzzy")
             self.log(f"Merge completato. Salvato: {os.path.basename(out_path)}")
-            messagebox.showinfo("Merge Finito", f"Recuperate {matches} traduzioni.")
+            self.ui_call(messagebox.showinfo, "Merge Finito", f"Recuperate {matches} traduzioni.")
 
         except Exception as e:
             self.log(f"Errore Merge: {e}")
@@ -570,6 +2448,10 @@ class TranslatorApp(ctk.CTk):
         except:
             pass
 
+    def clear_model_registry(self):
+        MODEL_REGISTRY.clear()
+        self.log(f"Modelli: {MODEL_REGISTRY.summary()}")
+
     def delete_selected_models(self):
         to_del = [r for v,r in self.model_checkboxes if v.get()]
         if not to_del: return
@@ -589,22 +2471,19 @@ class TranslatorApp(ctk.CTk):
         if not self.files_queue:
             messagebox.showwarning("!", "Carica file!")
             return
+        opts = self.snapshot_options()
+        if opts is None: return
         self.txt_preview.delete("0.0", "end")
         self.txt_preview.insert("0.0", "Elaborazione...\n")
-        threading.Thread(target=self._run_prev, daemon=True).start()
+        threading.Thread(target=self._run_prev, args=(self.files_queue[0], opts), daemon=True).start()
 
-    def _run_prev(self):
+    def _run_prev(self, f, opts):
         try:
-            f = self.files_queue[0]
-            col = self.combo_col.get()
-            src = self.languages[self.combo_src.get()]
-            tgt = self.languages[self.combo_tgt.get()]
-            try:
-                df = pd.read_csv(f, sep=';', engine='python', nrows=50, dtype=str, keep_default_na=False)
-                df.columns = df.columns.str.strip()
-            except:
-                df = pd.read_csv(f, sep=None, engine='python', nrows=50, dtype=str, keep_default_na=False)
-            
+            col = opts["col"]
+            src = opts["src"]
+            tgt = opts["tgt"][0]
+            df = DATASETS.head(f, 50)
+
             if col not in df.columns: return
             cands = df[col].astype(str).tolist()
             # Filter empty
@@ -613,216 +2492,177 @@ class TranslatorApp(ctk.CTk):
             if not cands: return
             samps = random.sample(cands, min(3, len(cands)))
             
-            mod = f"Helsinki-NLP/opus-mt-{src}-{tgt}"
-            tk_prev = MarianTokenizer.from_pretrained(mod)
-            md_prev = MarianMTModel.from_pretrained(mod)
+            mod = MODEL_TEMPLATE.format(src=src, tgt=tgt)
+            # Stessa chiave del batch: l'anteprima riusa il modello già caldo (e viceversa)
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            precision = run_precision(device, opts["fp16"], opts["int8"])
+            backend = MODEL_REGISTRY.get(mod, device, precision, opts["backend"])
             
             self.processor.update_patterns(self.protection_config)
             out_txt = ""
             for s in samps:
-                m = self.processor.mask_text(self.processor.fix_mojibake(s))
-                inp = tk_prev([m], return_tensors="pt")
-                out = md_prev.generate(**inp)
-                dec = tk_prev.batch_decode(out, skip_special_tokens=True)[0]
-                fin = self.processor.unmask_text(dec)
-                if self.chk_punct.get():
+                m, ph = self.processor.mask(self.processor.fix_mojibake(s))
+                dec = backend.translate([m], opts["decoding"])[0]
+                fin = self.processor.unmask(dec, ph)
+                if opts["auto_punct"]:
                     fin = self.processor.fix_punctuation(fin)
                 
                 warn = ""
-                if self.chk_safety.get():
+                if opts["safety"]:
                     ok, _ = self.safety_check(s, fin)
                     if not ok: warn = " [⚠️ SAFETY FAIL]"
                 out_txt += f"ORG: {s}\nTRD: {fin}{warn}\n---\n"
             
-            self.txt_preview.delete("0.0", "end")
-            self.txt_preview.insert("0.0", out_txt)
+            self.ui_call(self.show_preview, out_txt)
         except Exception as e:
             self.log(f"Err Prev: {e}")
 
+    def show_preview(self, text):
+        self.txt_preview.delete("0.0", "end")
+        self.txt_preview.insert("0.0", text)
+
+    def compare_int8(self):
+        if not self.files_queue:
+            messagebox.showwarning("!", "Carica file!")
+            return
+        opts = self.snapshot_options()
+        if opts is None: return
+        threading.Thread(target=self._run_compare_int8, args=(self.files_queue[0], opts), daemon=True).start()
+
+    def _run_compare_int8(self, fpath, opts):
+        try:
+            df = read_table(fpath)
+            self.processor.update_patterns(self.protection_config)
+            engine = LocalizationEngine(processor=self.processor, options=opts, log=self.log)
+            engine.compare_int8(df[opts["col"]].tolist())
+        except Exception as e:
+            self.log(f"Err Confronto: {e}")
+
     # --- CORE RUN ---
     def start_thread(self):
         if not self.files_queue:
             messagebox.showwarning("!", "Seleziona file!")
             return
+        opts = self.snapshot_options()
+        if opts is None: return
         self.is_running = True
         self.stop_event.clear()
         self.pause_event.set()
         self.btn_start.configure(state="disabled")
         self.btn_stop.configure(state="normal")
-        threading.Thread(target=self.run_batch, daemon=True).start()
-
-    def run_batch(self):
-        col = self.combo_col.get()
-        src = self.languages[self.combo_src.get()]
-        tgt = self.languages[self.combo_tgt.get()]
-        fp16 = self.chk_fp16.get() and torch.cuda.is_available()
-        safety = bool(self.chk_safety.get())
-        debug_col = bool(self.chk_debug_col.get())
-        use_online = self.chk_online.get() if self.chk_online else False
-        len_check = bool(self.chk_len_check.get())
-        skip_existing = bool(self.chk_skip_existing.get())
-        auto_punct = bool(self.chk_punct.get())
-
-        model_name = f"Helsinki-NLP/opus-mt-{src}-{tgt}"
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-
-        total_trans = 0
-        total_skip = 0
+        threading.Thread(target=self.run_batch, args=(opts, list(self.files_queue)), daemon=True).start()
 
+    def snapshot_options(self):
+        """
+        Opzioni lette dai widget sul thread della GUI, prima di avviare un worker
+        (che così non tocca mai Tk). None, con l'errore nel log, se la configurazione non è valida.
+        """
         try:
-            self.log(f"Caricamento {model_name}...")
-            tokenizer = MarianTokenizer.from_pretrained(model_name)
-            model = MarianMTModel.from_pretrained(model_name).to(device)
-            if fp16: model = model.half()
-            self.processor.update_patterns(self.protection_config)
-
-            for fpath in self.files_queue:
-                if self.stop_event.is_set(): break
-                self.log(f"File: {os.path.basename(fpath)}")
-                
-                if fpath.endswith('.csv'):
-                    try:
-                        df = pd.read_csv(fpath, sep=';', on_bad_lines='skip', dtype=str, keep_default_na=False)
-                    except:
-                        df = pd.read_csv(fpath, sep=None, engine='python', dtype=str, keep_default_na=False)
-                else:
-                    df = pd.read_excel(fpath, dtype=str)
-                
-                df.columns = df.columns.str.strip()
-                if col not in df.columns: continue
-
-                rows_to_do = []
-                if skip_existing:
-                    rows_to_do = (df[col] == "") | (df[col].isna())
-                    total_skip += len(df) - rows_to_do.sum()
-                else:
-                    rows_to_do = [True] * len(df)
+            return self.build_run_options()
+        except Exception as e:
+            self.log(f"Err configurazione: {e}")
+            return None
+
+    def build_run_options(self):
+        return {
+            "col": self.combo_col.get(),
+            "src": self.languages[self.combo_src.get()],
+            "tgt": [self.languages[self.combo_tgt.get()]] + [x.strip() for x in self.entry_extra_tgt.get().split(",") if x.strip()],
+            "fp16": bool(self.chk_fp16.get()),
+            "int8": bool(self.chk_int8.get()),
+            "backend": self.combo_backend.get(),
+            "decoding": self.combo_decoding.get(),
+            "safety": bool(self.chk_safety.get()),
+            "debug_col": bool(self.chk_debug_col.get()),
+            "online": bool(self.chk_online.get()) if self.chk_online else False,
+            "len_check": bool(self.chk_len_check.get()),
+            "skip_existing": bool(self.chk_skip_existing.get()),
+            "auto_punct": bool(self.chk_punct.get()),
+            "tm": bool(self.chk_tm.get()),
+            "glossary_whole_words": bool(self.chk_gloss_words.get()),
+            "stream_rows": STREAM_CHUNK_ROWS if self.chk_stream.get() else 0,
+            "segment": bool(self.chk_segment.get()),
+            "normalize": bool(self.chk_normalize.get()),
+            "metrics_path": "auto" if self.chk_metrics.get() else None,
+            "prometheus": bool(self.chk_metrics.get()),
+        }
 
-                df.loc[rows_to_do, col] = df.loc[rows_to_do, col].apply(self.processor.fix_mojibake)
-                df['Masked'] = df[col].apply(self.processor.mask_text)
+    def _on_engine_progress(self, frac, speed):
+        # Chiamato dal worker a ogni batch: niente Tk qui, lo applica drain_ui_queue
+        self.pending_progress = (frac, speed)
 
-                unique = [t for t in list(df.loc[rows_to_do, 'Masked'].unique()) if str(t).strip()]
-                cache_file = f"{fpath}.cache.json"
-                cache = {}
-                if os.path.exists(cache_file):
-                    with open(cache_file, 'r', encoding='utf-8') as f: cache = json.load(f)
-                
-                todo = [t for t in unique if t not in cache]
-                bs = 64 if fp16 else 32
-                if device == "cpu": bs = 16
-                
-                start_t = time.time()
-                proc = 0
-                
-                for i in range(0, len(todo), bs):
-                    if self.stop_event.is_set(): break
-                    self.pause_event.wait()
-                    batch = todo[i:i+bs]
-                    try:
-                        inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=512).to(device)
-                        with torch.no_grad(): trans = model.generate(**inputs)
-                        res = tokenizer.batch_decode(trans, skip_special_tokens=True)
-                        for s, r in zip(batch, res): cache[s] = r
-                    except: 
-                        for s in batch: cache[s] = s
-
-                    proc += len(batch)
-                    elapsed = time.time() - start_t
-                    if elapsed > 0:
-                        spd = proc/elapsed
-                        self.lbl_eta.configure(text=f"Speed: {spd:.1f}/s")
-                    
-                    self.progress.set((i/len(todo)) if len(todo)>0 else 1)
-                    if i>0 and (i//bs)%10==0:
-                        with open(cache_file, 'w', encoding='utf-8') as f: json.dump(cache, f)
-
-                with open(cache_file, 'w', encoding='utf-8') as f: json.dump(cache, f)
-
-                final_texts = []
-                statuses = []
-                failed_indices = []
-                
-                for idx, row in df.iterrows():
-                    if skip_existing and row[col] != "":
-                        final_texts.append(row[col])
-                        statuses.append("SKIPPED")
-                        continue
-
-                    masked = row['Masked']
-                    orig_full = self.processor.unmask_text(masked)
-                    trans_masked = cache.get(masked, masked)
-                    final = self.processor.unmask_text(trans_masked)
-                    if auto_punct:
-                        final = self.processor.fix_punctuation(final)
-
-                    status = "OK"
-                    if safety:
-                        ok, _ = self.safety_check(orig_full, final)
-                        if not ok:
-                            if use_online:
-                                try:
-                                    fb = GoogleTranslator(source=src, target=tgt).translate(orig_full)
-                                    if self.safety_check(orig_full, fb)[0]: final = fb; status = "ONLINE"
-                                    else: status = "FAIL"
-                                except: status = "FAIL"
-                            else: status = "FAIL"
-                            if status == "FAIL": 
-                                final = orig_full
-                                status = "SAFETY_FAIL"
-                                failed_indices.append({'idx': idx, 'orig': orig_full, 'trans': final})
-
-                    if len_check and status in ["OK", "ONLINE"]:
-                        if len(final) > len(orig_full) * 1.3: status += "_LEN"
-
-                    final_texts.append(final)
-                    statuses.append(status)
-                    total_trans += 1
-
-                df[col] = final_texts
-                if debug_col: df['QA_Status'] = statuses
-
-                if self.glossary_dict:
-                    gs = dict(sorted(self.glossary_dict.items(), key=lambda x: len(str(x[0])), reverse=True))
-                    df[col] = df[col].replace(gs, regex=True)
-
-                if self.processor.regex_rules:
-                    df[col] = df[col].apply(self.processor.apply_regex_rules)
-
-                df.drop(columns=['Masked'], inplace=True, errors='ignore')
-                out = fpath.rsplit('.', 1)[0] + f"_{tgt}_FINAL.csv"
-                # FIXED SAVING
-                df.to_csv(out, sep=';', index=False, encoding='utf-8-sig', quoting=csv.QUOTE_MINIMAL)
-                self.log(f"Salvato: {os.path.basename(out)}")
-                if os.path.exists(cache_file): os.remove(cache_file)
+    def run_batch(self, opts, files):
+        """Thread di lavoro: opts e files sono fotografati da start_thread sul thread della GUI."""
+        try:
+            self.processor.update_patterns(self.protection_config)
+            engine = LocalizationEngine(
+                processor=self.processor, options=opts, glossary=self.glossary_dict,
+                log=self.log, on_progress=self._on_engine_progress,
+                stop_event=self.stop_event, pause_event=self.pause_event)
+            report = engine.run(files)
 
             if not self.stop_event.is_set():
-                msg = f"Finito.\nTradotte: {total_trans}\nSaltate: {total_skip}"
+                msg = f"Finito.\nTradotte: {report['translated']}\nSaltate: {report['skipped']}"
                 self.log(msg)
-                messagebox.showinfo("Report", msg)
+                self.ui_call(messagebox.showinfo, "Report", msg)
 
         except Exception as e:
             self.log(f"Err: {e}")
         finally:
             self.is_running = False
-            self.btn_start.configure(state="normal")
-            self.btn_stop.configure(state="disabled")
+            self.ui_call(self.btn_start.configure, state="normal")
+            self.ui_call(self.btn_stop.configure, state="disabled")
 
     # --- UTILS ---
     def log(self, msg):
+        """Thread-safe: accoda il messaggio, console e file vengono aggiornati da drain_ui_queue."""
+        self.log_file.write(msg)
+        self.ui_queue.put(("log", msg))
+
+    def ui_call(self, func, *args, **kwargs):
+        """Esegue func sul thread della GUI (da usare nei thread di lavoro al posto dei widget)."""
+        self.ui_queue.put(("call", lambda: func(*args, **kwargs)))
+
+    def drain_ui_queue(self):
+        lines = []
+        try:
+            while True:
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == "log":
+                    lines.append(payload)
+                    continue
+                # Le righe accodate prima di una chiamata escono prima di essa
+                self._append_console(lines)
+                lines = []
+                try:
+                    payload()
+                except Exception as e:
+                    lines.append(f"Err UI: {e}")
+        except queue.Empty:
+            pass
+        self._append_console(lines)
+
+        progress = self.pending_progress
+        if progress is not None and progress is not self.shown_progress:
+            self.shown_progress = progress
+            frac, speed = progress
+            if speed is not None: self.lbl_eta.configure(text=f"Speed: {speed:.1f}/s")
+            self.progress.set(frac)
+
+        self.log_file.flush()
+        self.after(UI_POLL_MS, self.drain_ui_queue)
+
+    def _append_console(self, lines):
+        if not lines: return
         self.txt_log.configure(state="normal")
-        self.txt_log.insert(tk.END, f"> {msg}\n")
+        self.txt_log.insert(tk.END, "".join(f"> {m}\n" for m in lines))
+        excess = int(self.txt_log.index("end-1c").split(".")[0]) - UI_LOG_LINES
+        if excess > 0: self.txt_log.delete("1.0", f"{excess + 1}.0")
         self.txt_log.see(tk.END)
         self.txt_log.configure(state="disabled")
-        try:
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.datetime.now()}] {msg}\n")
-        except:
-            pass
 
     def safety_check(self, o, t):
-        v1 = self.processor.get_variables(o)
-        v2 = self.processor.get_variables(t)
-        return set(v1)==set(v2), t
+        return self.processor.safety_check(o, t)
 
     def load_files(self):
         p = filedialog.askopenfilenames(filetypes=[("Data", "*.csv *.xlsx")])
@@ -830,18 +2670,28 @@ class TranslatorApp(ctk.CTk):
             self.files_queue = list(p)
             self.lbl_file_count.configure(text=f"{len(p)} file", text_color="#2CC985")
             try:
-                df = pd.read_csv(p[0], sep=None, engine='python', nrows=2, dtype=str, keep_default_na=False)
-                df.columns=df.columns.str.strip()
+                df = DATASETS.head(p[0], 2)
                 self.combo_col.configure(values=list(df.columns))
                 self.combo_col.set(next((c for c in df.columns if "Text" in c or "English" in c), df.columns[0]))
             except: pass
+            # Parsing completo in background: anteprima, merge e run lo ritrovano già pronto.
+            # Non per i file grandi o in streaming: il DataFrame intero è proprio ciò che si vuole evitare
+            if not self.chk_stream.get() and os.path.getsize(p[0]) <= PREFETCH_MAX_MB * 1024 * 1024:
+                threading.Thread(target=self._prefetch, args=(p[0],), daemon=True).start()
+
+    def _prefetch(self, path):
+        try:
+            t = time.time()
+            rows = DATASETS.warm(path)
+            self.log(f"File letto: {rows} righe in {time.time() - t:.1f}s.")
+        except Exception as e:
+            self.log(f"Err lettura: {e}")
 
     def load_glossary(self, path=None):
         if not path: path = filedialog.askopenfilename()
         if path: 
             try:
-                df = pd.read_csv(path, sep=None, engine='python', header=None)
-                self.glossary_dict = dict(zip(df[0].astype(str), df[1].astype(str)))
+                self.glossary_dict = read_glossary(path)
                 self.lbl_gloss_status.configure(text=f"{len(self.glossary_dict)} termini", text_color="#2CC985")
             except: pass
 
@@ -887,10 +2737,19 @@ class TranslatorApp(ctk.CTk):
         d = self.profiles.get(n, {})
         if "src" in d: self.combo_src.set(d["src"])
         if "tgt" in d: self.combo_tgt.set(d["tgt"])
+        self.entry_extra_tgt.delete(0, 'end')
+        if d.get("extra_tgt"): self.entry_extra_tgt.insert(0, d["extra_tgt"])
         if "fp16" in d and torch.cuda.is_available():
             self.chk_fp16.select() if d["fp16"] else self.chk_fp16.deselect()
+        self.chk_tm.select() if d.get("tm", True) else self.chk_tm.deselect()
+        self.chk_int8.select() if d.get("int8", False) else self.chk_int8.deselect()
+        self.combo_backend.set(d.get("backend", "torch") if CT2_AVAILABLE else "torch")
+        self.combo_decoding.set(d.get("decoding", "Quality"))
         self.protection_config = d.get("patterns", [x.copy() for x in DEFAULT_PATTERNS])
         self.refresh_vars_list()
+        self.chk_normalize.select() if d.get("normalize", False) else self.chk_normalize.deselect()
+        self.template_config = d.get("templates", [x.copy() for x in TEMPLATE_PATTERNS])
+        self.processor.update_templates(self.template_config)
         self.txt_regex.delete("0.0", "end")
         for r in d.get("regex", []): self.txt_regex.insert("end", f"{r[0]} -> {r[1]}\n")
         self.save_regex_from_ui()
@@ -900,8 +2759,15 @@ class TranslatorApp(ctk.CTk):
         self.profiles[self.current_profile] = {
             "src": self.combo_src.get(),
             "tgt": self.combo_tgt.get(),
+            "extra_tgt": self.entry_extra_tgt.get(),
             "fp16": bool(self.chk_fp16.get()),
+            "tm": bool(self.chk_tm.get()),
+            "int8": bool(self.chk_int8.get()),
+            "backend": self.combo_backend.get(),
+            "decoding": self.combo_decoding.get(),
             "patterns": self.protection_config,
+            "normalize": bool(self.chk_normalize.get()),
+            "templates": self.template_config,
             "regex": self.processor.regex_rules
         }
         with open(PROFILES_FILE, 'w') as f: json.dump(self.profiles, f, indent=4)
@@ -925,13 +2791,117 @@ class TranslatorApp(ctk.CTk):
 
     def on_closing(self):
         self.save_current_profile()
+        self.log_file.flush(force=True)
         self.destroy()
 
     def reset_settings(self): 
         if os.path.exists(PROFILES_FILE): os.remove(PROFILES_FILE)
         self.log("Reset done.")
 
+# --- CLI (HEADLESS) ---
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="AI Localizer - traduzione batch senza GUI")
+    parser.add_argument("files", nargs="+", help="File .csv/.xlsx da tradurre")
+    parser.add_argument("--col", required=True, help="Colonna del testo")
+    parser.add_argument("--src", default="en", help="Lingua sorgente (es. en)")
+    parser.add_argument("--tgt", default="it", help="Lingua/e destinazione (es. it oppure it,fr,es,de)")
+    parser.add_argument("--model", default=MODEL_TEMPLATE, help="Modello o cartella locale ({src}/{tgt} vengono sostituiti)")
+    parser.add_argument("--profile", help="Profilo di profiles.json da cui leggere regex e variabili")
+    parser.add_argument("--glossary", help="Glossario .csv/.txt (Originale;Tradotto)")
+    parser.add_argument("--glossary-whole-words", action="store_true", help="Glossario solo su parole intere")
+    parser.add_argument("--fp16", action="store_true", help="FP16 (solo CUDA)")
+    parser.add_argument("--int8", action="store_true", help="CPU Turbo: modello quantizzato int8 (solo CPU)")
+    parser.add_argument("--backend", choices=BACKENDS, help="Runtime di inferenza (default: quello del profilo, altrimenti torch)")
+    parser.add_argument("--decoding", choices=list(DECODING_PROFILES), help="Profilo di decoding (default: quello del profilo, altrimenti Quality)")
+    parser.add_argument("--cpu-threads", type=int, help="Thread di torch su CPU (default: core disponibili)")
+    parser.add_argument("--sheet", help="Foglio da tradurre negli .xlsx (default: il primo)")
+    parser.add_argument("--csv-out", action="store_true", help="Scrive _FINAL.csv anche per gli .xlsx")
+    parser.add_argument("--infer-workers", type=int, default=1, help="Processi di inferenza su CPU (ognuno con il suo modello)")
+    parser.add_argument("--compare-workers", action="store_true", help="Confronta 1 processo e --infer-workers processi sul primo file ed esce")
+    parser.add_argument("--compare-int8", action="store_true", help="Confronta velocità e output fp32/int8 sul primo file ed esce")
+    parser.add_argument("--online", action="store_true", help="Google Translate fallback")
+    parser.add_argument("--online-workers", type=int, default=4, help="Richieste online in parallelo")
+    parser.add_argument("--online-rate", type=float, default=5.0, help="Richieste online al secondo (0 = senza limite)")
+    parser.add_argument("--online-retries", type=int, default=3, help="Tentativi per frase in caso di errore")
+    parser.add_argument("--online-url", help="Endpoint compatibile LibreTranslate per il fallback al posto di Google (es. http://localhost:5000)")
+    parser.add_argument("--overwrite", action="store_true", help="Traduci anche le celle già piene")
+    parser.add_argument("--no-safety", action="store_true", help="Disattiva il Safety Check")
+    parser.add_argument("--no-punct", action="store_true", help="Disattiva la correzione punteggiatura")
+    parser.add_argument("--no-len-check", action="store_true", help="Disattiva l'avviso lunghezza")
+    parser.add_argument("--no-status-col", action="store_true", help="Non scrivere la colonna QA_Status")
+    parser.add_argument("--max-tokens", type=int, help="Budget di token (con padding) per batch")
+    parser.add_argument("--tm", default=TM_FILE, help="Database della memoria di traduzione")
+    parser.add_argument("--no-tm", action="store_true", help="Non usare la memoria di traduzione")
+    parser.add_argument("--model-cache-mb", type=int, default=MODEL_REGISTRY.budget_mb, help="Budget RAM/VRAM per i modelli tenuti in memoria")
+    parser.add_argument("--shard-workers", type=int, default=1, help="Processi per il mask su file grandi")
+    parser.add_argument("--normalize", action="store_true", help="Chiavi normalizzate: spazi compattati e numeri come placeholder")
+    parser.add_argument("--no-pipeline", action="store_true", help="Tokenize, generate e decode in sequenza (senza thread)")
+    parser.add_argument("--segment", action="store_true", help="Traduce frase per frase le celle lunghe")
+    parser.add_argument("--metrics", nargs="?", const="auto", help="Report JSON dei tempi per stadio (default: run_metrics.json accanto all'output)")
+    parser.add_argument("--prometheus", action="store_true", help="Scrive anche le metriche in formato testo Prometheus (.prom)")
+    parser.add_argument("--stream-rows", type=int, default=0, help="Elabora i CSV a chunk di N righe (file enormi)")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    MODEL_REGISTRY.budget_mb = args.model_cache_mb
+
+    processor = TextProcessor()
+    profile = read_profile(args.profile) if args.profile else {}
+    processor.update_patterns(profile.get("patterns", DEFAULT_PATTERNS))
+    processor.update_templates(profile.get("templates", TEMPLATE_PATTERNS))
+    processor.regex_rules = [tuple(r) for r in profile.get("regex", [])]
+
+    options = {
+        "col": args.col,
+        "src": args.src,
+        "tgt": args.tgt,
+        "model": args.model,
+        "fp16": args.fp16,
+        "int8": args.int8,
+        "backend": args.backend or profile.get("backend", "torch"),
+        "decoding": args.decoding or profile.get("decoding", "Quality"),
+        "cpu_threads": args.cpu_threads,
+        "safety": not args.no_safety,
+        "debug_col": not args.no_status_col,
+        "online": args.online,
+        "len_check": not args.no_len_check,
+        "skip_existing": not args.overwrite,
+        "auto_punct": not args.no_punct,
+        "max_tokens": args.max_tokens,
+        "tm": not args.no_tm,
+        "tm_path": args.tm,
+        "shard_workers": args.shard_workers,
+        "glossary_whole_words": args.glossary_whole_words,
+        "stream_rows": args.stream_rows,
+        "segment": args.segment,
+        "pipeline": not args.no_pipeline,
+        "infer_workers": args.infer_workers,
+        "sheet": args.sheet,
+        "xlsx_output": not args.csv_out,
+        "normalize": args.normalize or profile.get("normalize", False),
+        "metrics_path": args.metrics or ("auto" if args.prometheus else None),
+        "prometheus": args.prometheus,
+        "online_workers": args.online_workers,
+        "online_rate": args.online_rate,
+        "online_retries": args.online_retries,
+        "online_url": args.online_url,
+    }
+    glossary = read_glossary(args.glossary) if args.glossary else {}
+    engine = LocalizationEngine(processor=processor, options=options, glossary=glossary)
+    if args.compare_workers:
+        print(json.dumps(engine.compare_workers(read_table(args.files[0])[args.col].tolist()), indent=2))
+        return 0
+    if args.compare_int8:
+        print(json.dumps(engine.compare_int8(read_table(args.files[0])[args.col].tolist()), indent=2))
+        return 0
+    report = engine.run(args.files)
+    print(f"Finito. Tradotte: {report['translated']} Saltate: {report['skipped']} Fallite: {len(report['failed'])}")
+    return 1 if report["failed"] else 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
     try:
         app = TranslatorApp()
         app.mainloop()
@@ -0,0 +1,94 @@
+"""
+---------------------------------------------------------------------------
+AI CSV LOCALIZER - SERVER DI TRADUZIONE FINTO
+---------------------------------------------------------------------------
+Stand-in locale di un endpoint LibreTranslate (POST /translate) per provare
+il fallback online senza rete: traduce anteponendo "[lingua] " al testo.
+Può simulare errori transitori (503/429 sulle prime N richieste) e rifiuta
+le lingue non supportate con 400, come il servizio vero.
+
+    python fake_translation_server.py --port 5000 --fail-first 2
+    python AI_Localizer_V1_Complete.py dialoghi.csv --col Text --tgt it --online --online-url http://127.0.0.1:5000
+---------------------------------------------------------------------------
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LANGUAGES = {"en", "it", "fr", "es", "de", "pt", "ru", "ja", "zh", "ko", "pl", "nl"}
+
+class FakeTranslationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), fail_first=0, fail_status=503):
+        super().__init__(address, TranslateHandler)
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in un thread daemon (per i test); ritorna l'URL base."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.url
+
+class TranslateHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            failing = server.requests <= server.fail_first
+        if self.path.rstrip("/") != "/translate":
+            return self.reply(404, {"error": "Not found"})
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            return self.reply(400, {"error": "Invalid JSON"})
+        if failing:
+            return self.reply(server.fail_status, {"error": "Simulated failure"})
+        target = data.get("target")
+        if target not in LANGUAGES or data.get("source") not in LANGUAGES | {"auto"}:
+            return self.reply(400, {"error": f"{target} is not supported"})
+        q = data.get("q")
+        texts = q if isinstance(q, list) else [q]
+        with server.lock: server.texts += len(texts)
+        out = [f"[{target}] {t}" for t in texts]
+        self.reply(200, {"translatedText": out if isinstance(q, list) else out[0]})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server LibreTranslate finto per i test del fallback online.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--fail-first", type=int, default=0, help="Le prime N richieste falliscono")
+    parser.add_argument("--fail-status", type=int, default=503, help="Status delle richieste fallite (503, 429, ...)")
+    args = parser.parse_args(argv)
+    server = FakeTranslationServer((args.host, args.port), fail_first=args.fail_first, fail_status=args.fail_status)
+    print(f"In ascolto su {server.url}/translate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Normalizzazione (user-018): forma canonica, ripristino degli spazi e QA dei placeholder."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+loc = pytest.importorskip("AI_Localizer_V1_Complete")
+pd = pytest.importorskip("pandas")
+
+@pytest.fixture
+def proc():
+    p = loc.TextProcessor()
+    p.update_patterns(loc.DEFAULT_PATTERNS)
+    return p
+
+def test_canonical_form_shares_key(proc):
+    a = proc.mask_canonical("You found 5 gold")
+    b = proc.mask_canonical("  You  found\t12 gold ")
+    assert a[0] == b[0] == "You found __X_0_X__ gold"
+    assert a[1] == ("5",) and b[1] == ("12",)
+
+def test_numbers_follow_protected_codes(proc):
+    masked, ph = proc.mask_canonical("Deal {0} damage 3 times")
+    assert masked == "Deal __X_0_X__ damage __X_1_X__ times"
+    assert proc.unmask(masked, ph) == "Deal {0} damage 3 times"
+
+def test_has_placeholders(proc):
+    assert proc.has_placeholders("a __X_1_X__ b {0}", ("%s", "5"))
+    assert not proc.has_placeholders("a b __X_0_X__", ("%s", "5"))
+
+def run_assemble(proc, texts, translate):
+    engine = loc.LocalizationEngine(processor=proc, options={"col": "Text", "normalize": True,
+                                                             "skip_existing": False, "online": False})
+    df = pd.DataFrame({"Text": texts})
+    df, unique = engine.prepare_frame(df, {"skipped": 0})
+    cache = {m: translate(m) for m in unique if translate(m) is not None}  # None = non tradotta (stop)
+    final, status, failed = engine.assemble(df, cache)
+    return list(final), list(status), failed
+
+def test_assemble_restores_numbers_and_edge_spaces(proc):
+    final, status, _ = run_assemble(proc, ["  You found 5 gold", "You found 12 gold "],
+                                    lambda m: m.replace("You found", "Hai trovato").replace("gold", "oro"))
+    assert final == ["  Hai trovato 5 oro", "Hai trovato 12 oro "]
+    assert status == ["OK", "OK"]
+
+def test_dropped_number_placeholder_fails_safety(proc):
+    final, status, failed = run_assemble(proc, ["You found 5 gold"], lambda m: "Hai trovato oro")
+    assert status == ["SAFETY_FAIL"]
+    assert final == ["You found 5 gold"]
+    assert failed[0]["orig"] == "You found 5 gold"
+
+def test_untranslated_rows_keep_original_text(proc):
+    translated, _, _ = run_assemble(proc, ["A  spaced   line"], lambda m: m)
+    stopped, _, _ = run_assemble(proc, ["A  spaced   line"], lambda m: None)
+    assert translated == ["A spaced line"]
+    assert stopped == ["A  spaced   line"]
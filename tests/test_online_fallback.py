@@ -0,0 +1,50 @@
+"""Fallback online contro il server LibreTranslate finto (nessuna rete richiesta)."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+loc = pytest.importorskip("AI_Localizer_V1_Complete")
+from fake_translation_server import FakeTranslationServer  # noqa: E402
+
+@pytest.fixture
+def server(request):
+    opts = getattr(request, "param", {})
+    srv = FakeTranslationServer(**opts)
+    srv.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+def test_batches_unique_texts(server):
+    texts = [f"line {i}" for i in range(20)] * 2
+    client = loc.OnlineFallback("en", "it", workers=4, rate=0, base_url=server.url)
+    res = client.translate_many(texts)
+    assert res == {t: f"[it] {t}" for t in texts}
+    assert server.requests == 3  # 20 frasi uniche, BATCH = 8
+    assert server.texts == 20
+    assert client.errors == 0
+
+@pytest.mark.parametrize("server", [{"fail_first": 2}, {"fail_first": 1, "fail_status": 429}], indirect=True)
+def test_retries_transient_errors(server):
+    client = loc.OnlineFallback("en", "it", workers=1, rate=0, retries=3, base_url=server.url)
+    res = client.translate_many(["Hello", "World"])
+    assert res == {"Hello": "[it] Hello", "World": "[it] World"}
+    assert client.errors == server.fail_first
+    assert client.requests == server.fail_first + 1
+
+def test_permanent_error_is_not_retried(server):
+    client = loc.OnlineFallback("en", "xx", workers=1, rate=0, retries=3, base_url=server.url)
+    res = client.translate_many(["a", "b", "c"])
+    assert res == {"a": None, "b": None, "c": None}
+    # un batch rifiutato + una richiesta per frase per isolare quella non valida, nessun retry
+    assert server.requests == 4
+    assert client.errors == 4
+
+def test_unreachable_endpoint_gives_none():
+    client = loc.OnlineFallback("en", "it", workers=1, rate=0, retries=1, base_url="http://127.0.0.1:9")
+    assert client.translate_many(["Hello"]) == {"Hello": None}
+    assert client.requests == 2
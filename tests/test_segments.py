@@ -0,0 +1,45 @@
+"""split_segments: divisione in frasi per la segmentazione (user-017)."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+loc = pytest.importorskip("AI_Localizer_V1_Complete")
+
+def sentences(text):
+    parts = loc.split_segments(text)
+    assert "".join(s + sep for s, sep in parts) == text
+    return [s for s, _ in parts]
+
+@pytest.mark.parametrize("text", [
+    "One. Two!  Three?\nFour",
+    "  leading and trailing  ",
+    "Wait... What? «Yes.» Then __X_0_X__ came.",
+    "",
+])
+def test_roundtrip(text):
+    sentences(text)
+
+def test_splits_on_sentence_end():
+    assert sentences("The gate is open. Go now! Are you ready? Yes.") == \
+        ["The gate is open.", "Go now!", "Are you ready?", "Yes."]
+
+def test_splits_before_digit_and_placeholder():
+    assert sentences("Done. 3 left. __X_0_X__ waits.") == ["Done.", "3 left.", "__X_0_X__ waits."]
+
+def test_no_split_on_lowercase_continuation():
+    assert sentences("Version 1.5 is out. see notes.") == ["Version 1.5 is out. see notes."]
+
+@pytest.mark.parametrize("text", ["Mr. Smith arrived.", "Ask Dr. Who today.", "Use a tool, e.g. The hammer.",
+                                  "J. R. R. Tolkien wrote it.", "Il Sig. Rossi è qui."])
+def test_abbreviations_do_not_split(text):
+    assert sentences(text) == [text]
+
+def test_abbreviation_then_real_sentence_end():
+    assert sentences("Mr. Smith left. Dr. Who stayed.") == ["Mr. Smith left.", "Dr. Who stayed."]
+
+def test_ellipsis_after_initial_still_splits():
+    assert sentences("Plan B... Then run.") == ["Plan B...", "Then run."]
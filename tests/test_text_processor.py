@@ -0,0 +1,40 @@
+"""Mask/unmask di TextProcessor: placeholder per riga e recupero delle forme "allucinate"."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+loc = pytest.importorskip("AI_Localizer_V1_Complete")
+
+@pytest.fixture
+def proc():
+    p = loc.TextProcessor()
+    p.update_patterns(loc.DEFAULT_PATTERNS)
+    return p
+
+def test_mask_dedups_codes(proc):
+    masked, ph = proc.mask("Hi {0}, you have %s gold {0}")
+    assert masked == "Hi __X_0_X__, you have __X_1_X__ gold __X_0_X__"
+    assert ph == ("{0}", "%s")
+
+def test_mask_unmask_roundtrip(proc):
+    text = "Press <color=red|b> to use #GSWORD#E ($HERO$)"
+    assert proc.unmask(*proc.mask(text)) == text
+
+@pytest.mark.parametrize("translated", ["Ciao {1} e {0}", "Ciao (1) e (0)", "Ciao [1] e [0]",
+                                        "Ciao X_1_X e X_0_X", "Ciao __X 1 X__ e __X 0 X__"])
+def test_unmask_recovers_mangled_forms(proc, translated):
+    assert proc.unmask(translated, ("%s", "%d")) == "Ciao %d e %s"
+
+def test_exact_form_wins_over_recovery(proc):
+    # __X_0_X__ è presente: il "{0}" letterale del modello non va toccato
+    assert proc.unmask("__X_0_X__ costa {0}", ("%s",)) == "%s costa {0}"
+
+def test_out_of_range_placeholder_is_left_alone(proc):
+    assert proc.unmask("a __X_3_X__ (3)", ("%s",)) == "a __X_3_X__ (3)"
+
+def test_unmask_without_placeholders_is_identity(proc):
+    assert proc.unmask("Ciao (1)", ()) == "Ciao (1)"